@@ -0,0 +1,96 @@
+"""
+Pieces shared by the benchmark scripts: the steps and LOBs every script
+drives, the environment that points the app's stores at a scratch directory,
+and a local uvicorn serving ``main:app`` for the scripts that need a server.
+"""
+from typing import Dict, Optional
+from pathlib import Path
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+STEPS = ["lifecycle", "opportunity", "offers", "launch"]
+LOBS = ["DATA", "VOICE", "VAS"]
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def store_env(scratch: str) -> Dict[str, str]:
+    """NIYAX_DATA_DIR / NIYAX_RUNTIME_DIR inside scratch, so sessions and launch files stay out of the tree."""
+    return {"NIYAX_DATA_DIR": os.path.join(scratch, "data"),
+            "NIYAX_RUNTIME_DIR": os.path.join(scratch, "runtime")}
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class LocalServer:
+    """uvicorn serving main:app on a free port, its stores in a temporary directory removed on stop()."""
+
+    def __init__(self, workers: int = 1, step_delay: str = "0", quiet: bool = False):
+        self.workers = workers
+        self.step_delay = step_delay
+        self.quiet = quiet
+        self.port = free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.proc: Optional[subprocess.Popen] = None
+        self.scratch: Optional[str] = None
+        self.started_at = 0.0
+
+    def start(self) -> "LocalServer":
+        self.scratch = tempfile.mkdtemp(prefix="niyax-server-")
+        env = dict(os.environ, NIYAX_STEP_DELAY_S=self.step_delay, **store_env(self.scratch))
+        out = subprocess.DEVNULL if self.quiet else None
+        self.started_at = time.perf_counter()
+        self.proc = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(self.port),
+             "--workers", str(self.workers), "--log-level", "warning"],
+            cwd=str(ROOT), env=env, stdout=out, stderr=out)
+        return self
+
+    def wait_healthy(self, timeout: float = 60.0, poll_s: float = 0.1) -> float:
+        """Poll /health until it answers 200; returns the seconds since start()."""
+        import httpx
+
+        with httpx.Client(base_url=self.url, timeout=max(poll_s, 1.0)) as client:
+            while time.perf_counter() - self.started_at < timeout:
+                if self.proc.poll() is not None:
+                    raise RuntimeError("uvicorn exited during startup")
+                try:
+                    if client.get("/health").status_code == 200:
+                        return time.perf_counter() - self.started_at
+                except httpx.TransportError:
+                    pass
+                time.sleep(poll_s)
+        raise RuntimeError(f"no healthy /health within {timeout:.0f}s")
+
+    def stop(self) -> None:
+        if self.proc is not None:
+            self.proc.terminate()
+            try:
+                self.proc.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+                self.proc.wait()
+            self.proc = None
+        if self.scratch is not None:
+            shutil.rmtree(self.scratch, ignore_errors=True)
+            self.scratch = None
+
+    def __enter__(self) -> "LocalServer":
+        self.start()
+        try:
+            self.wait_healthy()
+        except BaseException:
+            self.stop()
+            raise
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
@@ -0,0 +1,166 @@
+"""
+Load test: concurrent analysts driving full sessions against a running server.
+
+Each virtual analyst loops over: upload a synthetic CSV, run every step,
+preview each step, fetch the impact forecast and download the launch file.
+Latency percentiles, error rate and throughput are reported per endpoint.
+
+    # against a server you started yourself
+    python -m bench.loadtest --url http://127.0.0.1:8000 --users 8 --rows 20k --duration 60
+
+    # spawn a local uvicorn (optionally with several workers) for the run;
+    # its sessions and launch files go to a temporary directory
+    python -m bench.loadtest --spawn --workers 2 --users 16 --rows 10k --sessions 2
+"""
+from typing import Any, Dict, List, Optional
+from collections import defaultdict
+from pathlib import Path
+import argparse
+import asyncio
+import json
+import sys
+import time
+
+import numpy as np
+
+from bench.common import LOBS, STEPS, LocalServer
+from bench.synthetic import generate_base, parse_size
+
+
+class Recorder:
+    def __init__(self):
+        self.latency: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.error_samples: Dict[str, str] = {}
+
+    def add(self, endpoint: str, seconds: float, ok: bool, detail: str = ""):
+        self.latency[endpoint].append(seconds)
+        if not ok:
+            self.errors[endpoint] += 1
+            self.error_samples.setdefault(endpoint, detail[:200])
+
+    def summary(self, wall_s: float) -> Dict[str, Dict[str, Any]]:
+        out = {}
+        for ep, lat in sorted(self.latency.items()):
+            arr = np.asarray(lat)
+            p50, p95, p99 = np.percentile(arr, [50, 95, 99])
+            out[ep] = {
+                "requests": int(arr.size),
+                "errors": int(self.errors.get(ep, 0)),
+                "error_rate": round(self.errors.get(ep, 0) / arr.size, 4),
+                "p50_s": round(float(p50), 4),
+                "p95_s": round(float(p95), 4),
+                "p99_s": round(float(p99), 4),
+                "max_s": round(float(arr.max()), 4),
+                "rps": round(arr.size / wall_s, 3) if wall_s > 0 else None,
+            }
+        return out
+
+
+async def _call(rec: Recorder, endpoint: str, coro):
+    t0 = time.perf_counter()
+    try:
+        r = await coro
+        ok = r.status_code < 400
+        rec.add(endpoint, time.perf_counter() - t0, ok, "" if ok else f"{r.status_code} {r.text}")
+        return r if ok else None
+    except Exception as e:
+        rec.add(endpoint, time.perf_counter() - t0, False, repr(e))
+        return None
+
+
+async def run_session(client, rec: Recorder, csv_bytes: bytes):
+    r = await _call(rec, "upload", client.post("/api/upload", files={"file": ("base.csv", csv_bytes, "text/csv")}))
+    if r is None:
+        return
+    sid = r.json()["session_id"]
+
+    for step in STEPS:
+        body = {"session_id": sid, "step": step, "lobs": LOBS, "opportunity_types": ["Auto"]}
+        if await _call(rec, f"run_step:{step}", client.post("/api/run_step", json=body)) is None:
+            return
+        await _call(rec, "preview", client.get(f"/api/preview/{sid}", params={"step": step, "n": 12}))
+
+    await _call(rec, "impact_forecast",
+                client.get("/api/impact_forecast", params={"session_id": sid, "lobs": ",".join(LOBS)}))
+    await _call(rec, "download", client.get(f"/api/download/{sid}"))
+
+
+async def analyst(client, rec: Recorder, csv_bytes: bytes, sessions: int, deadline: Optional[float]):
+    done = 0
+    while True:
+        if deadline is not None and time.monotonic() >= deadline:
+            return
+        if deadline is None and done >= sessions:
+            return
+        await run_session(client, rec, csv_bytes)
+        done += 1
+
+
+async def run_load(url: str, users: int, csv_bytes: bytes, sessions: int, duration: Optional[float],
+                   timeout: float) -> Dict[str, Any]:
+    import httpx
+
+    rec = Recorder()
+    limits = httpx.Limits(max_connections=users, max_keepalive_connections=users)
+    async with httpx.AsyncClient(base_url=url, timeout=timeout, limits=limits) as client:
+        deadline = time.monotonic() + duration if duration else None
+        t0 = time.perf_counter()
+        await asyncio.gather(*[analyst(client, rec, csv_bytes, sessions, deadline) for _ in range(users)])
+        wall = time.perf_counter() - t0
+    return {"wall_s": round(wall, 3), "endpoints": rec.summary(wall), "error_samples": rec.error_samples}
+
+
+def print_report(report: Dict[str, Any]):
+    print(f"\n{'endpoint':<22}{'reqs':>7}{'err%':>8}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}{'rps':>9}")
+    for ep, s in report["endpoints"].items():
+        print(f"{ep:<22}{s['requests']:>7}{s['error_rate'] * 100:>7.1f}%"
+              f"{s['p50_s']:>9.3f}{s['p95_s']:>9.3f}{s['p99_s']:>9.3f}{s['max_s']:>9.3f}{s['rps']:>9.2f}")
+    print(f"\nwall time {report['wall_s']:.1f}s")
+    for ep, msg in report["error_samples"].items():
+        print(f"  first error on {ep}: {msg}")
+
+
+def main(argv: Optional[list] = None) -> int:
+    ap = argparse.ArgumentParser(description="Concurrent-analyst load test for the NiYA-X API.")
+    ap.add_argument("--url", default=None, help="Base URL of a running server")
+    ap.add_argument("--spawn", action="store_true", help="Start a local uvicorn for the run")
+    ap.add_argument("--workers", type=int, default=1, help="uvicorn workers when --spawn is used")
+    ap.add_argument("--step-delay", default="0", help="NIYAX_STEP_DELAY_S for the spawned server")
+    ap.add_argument("--users", type=int, default=4, help="Concurrent analysts")
+    ap.add_argument("--rows", default="10k", help="Rows per uploaded file, e.g. 2000, 20k or 1m")
+    ap.add_argument("--sessions", type=int, default=1, help="Sessions per analyst (ignored with --duration)")
+    ap.add_argument("--duration", type=float, default=None, help="Run for this many seconds instead")
+    ap.add_argument("--timeout", type=float, default=300.0, help="Per-request timeout in seconds")
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--out", default=None, help="Write the report as JSON here")
+    args = ap.parse_args(argv)
+
+    if not args.url and not args.spawn:
+        ap.error("pass --url or --spawn")
+
+    csv_bytes = generate_base(parse_size(args.rows), args.seed).to_csv(index=False).encode("utf-8")
+    server = LocalServer(args.workers, args.step_delay) if args.spawn else None
+    url = server.url if server else args.url
+    try:
+        if server:
+            server.start().wait_healthy()
+        print(f"▶ {args.users} analysts, {parse_size(args.rows):,} rows/file against {url}", flush=True)
+        report = asyncio.run(run_load(url, args.users, csv_bytes, args.sessions, args.duration, args.timeout))
+    finally:
+        if server:
+            server.stop()
+
+    report["config"] = {"url": url, "users": args.users, "rows": parse_size(args.rows),
+                        "sessions": args.sessions, "duration": args.duration, "workers": args.workers}
+    print_report(report)
+    if args.out:
+        Path(args.out).write_text(json.dumps(report, indent=2), encoding="utf-8")
+        print(f"Report written to {args.out}")
+    total = sum(s["requests"] for s in report["endpoints"].values())
+    errors = sum(s["errors"] for s in report["endpoints"].values())
+    return 1 if total == 0 or errors == total else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,134 @@
+"""
+Peak-RSS regression check, one step at a time.
+
+A synthetic base is uploaded and taken through every step once, into a
+temporary session store. Each step is then re-run in a fresh process that
+first loads the stored session and then measures the step's peak resident
+memory above what the process held when the step started. On Linux the
+high-water mark is reset just before the step (``/proc/self/clear_refs``),
+so loading the session does not mask the step; elsewhere the growth of
+``ru_maxrss`` is used, which can under-report. A step fails the check when
+that growth exceeds its budget: a multiple of the in-memory size of the
+uploaded frame plus a fixed allowance for buffers that do not scale with it.
+
+    python -m bench.memory --rows 20k
+    python -m bench.memory --rows 20k --budget opportunity=8 --out mem.json
+"""
+from typing import Any, Dict, Optional
+from pathlib import Path
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from bench.common import LOBS, ROOT, STEPS, store_env
+from bench.synthetic import generate_base, parse_size
+
+# Allowed peak growth per step: (multiple of the uploaded frame's bytes, fixed MB).
+# Calibrated on 5k-50k synthetic rows with ~20% headroom over the measured
+# slope. Lifecycle builds string columns (~5x the numeric base) and launch
+# only writes the offers frame out; both fail when the deep copies that
+# copy-on-write removed come back (lifecycle +2x, launch +8x at 20k rows).
+# opportunity and offers build a Python row dict per subscriber and LOB, so
+# their budgets only catch gross regressions.
+DEFAULT_BUDGETS = {
+    "lifecycle": (5.75, 2.0),
+    "opportunity": (45.0, 8.0),
+    "offers": (60.0, 8.0),
+    "launch": (1.0, 2.0),
+}
+
+
+def prepare(rows: int, seed: int) -> str:
+    """Upload a base and run every step once, so each measured step finds its inputs stored."""
+    from fastapi.testclient import TestClient
+    import main
+
+    client = TestClient(main.app)
+    csv_bytes = generate_base(rows, seed).to_csv(index=False).encode("utf-8")
+    r = client.post("/api/upload", files={"file": ("base.csv", csv_bytes, "text/csv")})
+    r.raise_for_status()
+    sid = r.json()["session_id"]
+    for step in STEPS:
+        body = {"session_id": sid, "step": step, "lobs": LOBS, "opportunity_types": ["Auto"]}
+        client.post("/api/run_step", json=body).raise_for_status()
+    return sid
+
+
+def measure_step(sid: str, step: str) -> Dict[str, Any]:
+    """Runs in the child process: load the session, then run one step."""
+    import main
+    import metrics
+
+    sess = main._require_session(sid)
+    input_bytes = int(sess["raw"].memory_usage(deep=True).sum())
+    req = main.StepRequest(session_id=sid, step=step, lobs=LOBS, opportunity_types=["Auto"])
+
+    start = metrics.rss_bytes()
+    with metrics.peak_rss_window() as mem:
+        main.run_step(req)
+    growth = mem["bytes"]
+    return {"step": step, "method": mem["method"], "input_bytes": input_bytes, "start_rss_bytes": start,
+            "peak_growth_bytes": growth, "ratio": round(growth / max(input_bytes, 1), 3)}
+
+
+def main(argv: Optional[list] = None) -> int:
+    ap = argparse.ArgumentParser(description="Per-step peak-RSS regression check.")
+    ap.add_argument("--rows", default="20k", help="Rows in the synthetic base, e.g. 20k")
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--steps", default=",".join(STEPS), help="Comma-separated steps to check")
+    ap.add_argument("--budget", action="append", default=[], metavar="STEP=RATIO",
+                    help="Override a step's budget ratio (peak growth / input frame bytes)")
+    ap.add_argument("--out", default=None, help="Write the results as JSON here")
+    ap.add_argument("--child", nargs=2, metavar=("SESSION", "STEP"), help=argparse.SUPPRESS)
+    args = ap.parse_args(argv)
+
+    if args.child:
+        print(json.dumps(measure_step(*args.child)))
+        return 0
+
+    budgets = dict(DEFAULT_BUDGETS)
+    for item in args.budget:
+        step, _, ratio = item.partition("=")
+        budgets[step.strip()] = (float(ratio), budgets.get(step.strip(), (0.0, 2.0))[1])
+
+    rows = parse_size(args.rows)
+    scratch = tempfile.mkdtemp(prefix="niyax-mem-")
+    try:
+        env = dict(os.environ, NIYAX_STEP_DELAY_S="0", **store_env(scratch))
+        prep = subprocess.run(
+            [sys.executable, "-c", f"from bench.memory import prepare; print(prepare({rows}, {args.seed}))"],
+            cwd=str(ROOT), env=env, capture_output=True, text=True, check=True)
+        sid = prep.stdout.strip().splitlines()[-1]
+
+        results, failures = [], []
+        for step in [s.strip() for s in args.steps.split(",") if s.strip()]:
+            out = subprocess.run([sys.executable, "-m", "bench.memory", "--child", sid, step],
+                                 cwd=str(ROOT), env=env, capture_output=True, text=True, check=True)
+            rec = json.loads(out.stdout.strip().splitlines()[-1])
+            ratio, allowance_mb = budgets[step]
+            rec["budget_bytes"] = int(ratio * rec["input_bytes"] + allowance_mb * 1e6)
+            rec["ok"] = rec["peak_growth_bytes"] <= rec["budget_bytes"]
+            results.append(rec)
+            print(f"{step:<12} input {rec['input_bytes'] / 1e6:>7.1f} MB  peak growth "
+                  f"{rec['peak_growth_bytes'] / 1e6:>7.1f} MB (x{rec['ratio']})  budget "
+                  f"{rec['budget_bytes'] / 1e6:>7.1f} MB  {'ok' if rec['ok'] else 'OVER'}", flush=True)
+            if not rec["ok"]:
+                failures.append(step)
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    if args.out:
+        Path(args.out).write_text(json.dumps({"rows": rows, "results": results}, indent=2), encoding="utf-8")
+        print(f"Results written to {args.out}")
+    if failures:
+        print(f"❌ peak RSS over budget for: {', '.join(failures)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,126 @@
+"""
+Local stand-in for the NEON-dX ingestion API, for publish throughput tests.
+
+Accepts the batches /api/publish sends (POST, JSON body, Idempotency-Key
+header), de-duplicates resent batches, and can inject latency and transient
+failures to exercise retries and backpressure. GET /stats returns counters.
+
+    python -m bench.mock_neon_dx --port 9100 --latency-ms 20 --fail-rate 0.05
+    NIYAX_PUBLISH_URL_NEON_DX=http://127.0.0.1:9100/ingest uvicorn main:app
+"""
+from typing import Optional
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import argparse
+import json
+import random
+import threading
+import time
+
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.batches = 0
+        self.records = 0
+        self.bytes = 0
+        self.duplicates = 0
+        self.injected_failures = 0
+        self.seen = set()
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            elapsed = max(time.time() - self.started, 1e-9)
+            return {
+                "batches": self.batches,
+                "records": self.records,
+                "bytes": self.bytes,
+                "duplicates": self.duplicates,
+                "injected_failures": self.injected_failures,
+                "records_per_s": round(self.records / elapsed, 1),
+                "mb_per_s": round(self.bytes / elapsed / 1e6, 2),
+            }
+
+
+def make_handler(stats: Stats, latency_s: float, fail_rate: float):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive
+
+        def log_message(self, *args):
+            pass
+
+        def _reply(self, status: int, payload: dict, headers: Optional[dict] = None):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path.rstrip("/") == "/stats":
+                self._reply(200, stats.snapshot())
+            else:
+                self._reply(404, {"detail": "not found"})
+
+        def do_POST(self):
+            raw = self.rfile.read(int(self.headers.get("Content-Length", "0")))
+            if latency_s:
+                time.sleep(latency_s)
+            if fail_rate and random.random() < fail_rate:
+                with stats.lock:
+                    stats.injected_failures += 1
+                self._reply(503, {"detail": "injected failure"}, {"Retry-After": "0"})
+                return
+            try:
+                payload = json.loads(raw)
+            except ValueError:
+                self._reply(400, {"detail": "invalid JSON"})
+                return
+            key = self.headers.get("Idempotency-Key") or f"{payload.get('reference_id')}-{payload.get('batch')}"
+            with stats.lock:
+                if key in stats.seen:
+                    stats.duplicates += 1
+                else:
+                    stats.seen.add(key)
+                    stats.batches += 1
+                    stats.records += len(payload.get("records", []))
+                    stats.bytes += len(raw)
+            self._reply(200, {"accepted": True, "batch": payload.get("batch")})
+
+    return Handler
+
+
+def main(argv: Optional[list] = None):
+    ap = argparse.ArgumentParser(description="Mock NEON-dX target for publish throughput tests.")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=9100)
+    ap.add_argument("--latency-ms", type=float, default=0.0, help="Added latency per batch")
+    ap.add_argument("--fail-rate", type=float, default=0.0, help="Fraction of batches answered with 503")
+    ap.add_argument("--report-every", type=float, default=5.0, help="Seconds between throughput lines (0: off)")
+    args = ap.parse_args(argv)
+
+    stats = Stats()
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(stats, args.latency_ms / 1000.0, args.fail_rate))
+    print(f"Mock NEON-dX listening on http://{args.host}:{args.port} (POST any path, GET /stats)", flush=True)
+
+    if args.report_every > 0:
+        def report():
+            while True:
+                time.sleep(args.report_every)
+                print(json.dumps(stats.snapshot()), flush=True)
+        threading.Thread(target=report, daemon=True).start()
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(json.dumps(stats.snapshot()))
+
+
+if __name__ == "__main__":
+    main()
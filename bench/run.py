@@ -0,0 +1,214 @@
+"""
+Benchmark suite for the campaign pipeline.
+
+For each base size it uploads a synthetic CSV through the FastAPI app, runs
+every step (timing, throughput and traced peak memory per step), previews
+each step, fetches the impact forecast and downloads the launch file. The
+upload->download round trip is timed end to end. Sessions and launch files
+go to a temporary directory (unless NIYAX_DATA_DIR / NIYAX_RUNTIME_DIR are
+set), never to the working tree. Results are written as JSON and can be
+compared against an earlier run:
+
+    python -m bench.run --sizes 10k,100k --out bench/results/latest.json
+    python -m bench.run --sizes 10k --baseline bench/results/latest.json
+"""
+from typing import Any, Dict, List, Optional
+from pathlib import Path
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# The UI pause in run_step would dominate every timing
+os.environ.setdefault("NIYAX_STEP_DELAY_S", "0")
+
+import numpy as np
+import pandas as pd
+
+from bench.common import LOBS, STEPS, store_env
+from bench.synthetic import generate_base, parse_size
+
+
+def _client():
+    from fastapi.testclient import TestClient
+    import main
+    return TestClient(main.app)
+
+
+def _timed(fn, trace_memory: bool):
+    if trace_memory:
+        tracemalloc.start()
+    t0 = time.perf_counter()
+    try:
+        result = fn()
+    finally:
+        elapsed = time.perf_counter() - t0
+        peak = tracemalloc.get_traced_memory()[1] if trace_memory else None
+        if trace_memory:
+            tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def bench_size(client, rows: int, seed: int, trace_memory: bool) -> Dict[str, Any]:
+    csv_bytes = generate_base(rows, seed).to_csv(index=False).encode("utf-8")
+    rec: Dict[str, Any] = {"rows": rows, "csv_bytes": len(csv_bytes), "steps": {}, "preview_s": {}}
+
+    t_round = time.perf_counter()
+    r, rec["upload_s"], _ = _timed(
+        lambda: client.post("/api/upload", files={"file": ("base.csv", csv_bytes, "text/csv")}), False)
+    r.raise_for_status()
+    sid = r.json()["session_id"]
+
+    for step in STEPS:
+        body = {"session_id": sid, "step": step, "lobs": LOBS, "opportunity_types": ["Auto"]}
+        r, elapsed, _ = _timed(lambda: client.post("/api/run_step", json=body), False)
+        r.raise_for_status()
+        payload = r.json()
+        step_s = payload.get("elapsed_s", elapsed)
+        processed = payload.get("rows", rows)
+        rec["steps"][step] = {
+            "seconds": round(step_s, 4),
+            "http_seconds": round(elapsed, 4),
+            "rows_per_s": round(processed / step_s, 1) if step_s > 0 else None,
+            "peak_traced_bytes": None,
+        }
+
+    for step in STEPS:
+        r, elapsed, _ = _timed(lambda: client.get(f"/api/preview/{sid}", params={"step": step, "n": 12}), False)
+        r.raise_for_status()
+        rec["preview_s"][step] = round(elapsed, 4)
+
+    r, rec["forecast_s"], _ = _timed(
+        lambda: client.get("/api/impact_forecast", params={"session_id": sid, "lobs": ",".join(LOBS)}), False)
+    r.raise_for_status()
+
+    r, rec["download_s"], _ = _timed(lambda: client.get(f"/api/download/{sid}"), False)
+    r.raise_for_status()
+    rec["download_bytes"] = len(r.content)
+    rec["roundtrip_s"] = round(time.perf_counter() - t_round, 4)
+
+    if trace_memory:
+        # Separate pass: tracemalloc slows allocation-heavy code several-fold,
+        # so it runs after the timed round trip. Re-running a step is idempotent.
+        for step in STEPS:
+            body = {"session_id": sid, "step": step, "lobs": LOBS, "opportunity_types": ["Auto"]}
+            r, _, peak = _timed(lambda: client.post("/api/run_step", json=body), True)
+            r.raise_for_status()
+            rec["steps"][step]["peak_traced_bytes"] = peak
+
+    for k in ("upload_s", "forecast_s", "download_s"):
+        rec[k] = round(rec[k], 4)
+    return rec
+
+
+def _meta() -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=Path(__file__).resolve().parent).stdout.strip()
+    except Exception:
+        commit = ""
+    return {
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def _flatten(rec: Dict[str, Any]) -> Dict[str, float]:
+    out = {}
+    for k, v in rec.items():
+        if isinstance(v, dict):
+            for kk, vv in _flatten(v).items():
+                out[f"{k}.{kk}"] = vv
+        elif isinstance(v, (int, float)) and not isinstance(v, bool):
+            out[k] = float(v)
+    return out
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], max_ratio: float,
+            min_seconds: float = 0.05) -> List[str]:
+    """Return lines describing metrics that got slower/bigger than max_ratio x baseline.
+
+    Timings below min_seconds in both runs are reported but never flagged (noise).
+    """
+    base_by_rows = {r["rows"]: _flatten(r) for r in baseline.get("results", [])}
+    regressions = []
+    for rec in current["results"]:
+        base = base_by_rows.get(rec["rows"])
+        if not base:
+            continue
+        for key, val in _flatten(rec).items():
+            old = base.get(key)
+            if not old or key in ("csv_bytes", "download_bytes") or key.endswith("rows_per_s"):
+                continue
+            ratio = val / old
+            line = f"{rec['rows']:>10,}  {key:<40} {old:>12.4g} -> {val:>12.4g}  x{ratio:.2f}"
+            print(line)
+            is_time = key.endswith(("_s", "seconds"))
+            if ratio > max_ratio and not (is_time and max(val, old) < min_seconds):
+                regressions.append(line)
+    return regressions
+
+
+def main(argv: Optional[list] = None) -> int:
+    ap = argparse.ArgumentParser(description="Benchmark every pipeline step through the FastAPI app.")
+    ap.add_argument("--sizes", default="10k,100k", help="Comma-separated row counts, k/m suffixes allowed (e.g. 10k,100k,1m)")
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--no-memory", action="store_true", help="Skip tracemalloc peak tracking (faster)")
+    ap.add_argument("--out", default=None, help="Result JSON (default: bench/results/bench-<timestamp>.json)")
+    ap.add_argument("--baseline", default=None, help="Earlier result JSON to compare against")
+    ap.add_argument("--max-regression", type=float, default=1.25,
+                    help="Fail when a metric exceeds this multiple of the baseline")
+    ap.add_argument("--min-seconds", type=float, default=0.05,
+                    help="Ignore timing regressions when both runs are faster than this")
+    args = ap.parse_args(argv)
+
+    # Keep benchmark sessions out of the repo's data/ and runtime/ (main reads these at import)
+    scratch = tempfile.mkdtemp(prefix="niyax-bench-")
+    for key, value in store_env(scratch).items():
+        os.environ.setdefault(key, value)
+    try:
+        client = _client()
+        results = []
+        for size in args.sizes.split(","):
+            rows = parse_size(size)
+            print(f"▶ {rows:,} rows", flush=True)
+            rec = bench_size(client, rows, args.seed, trace_memory=not args.no_memory)
+            for step, s in rec["steps"].items():
+                print(f"   {step:<12} {s['seconds']:>9.3f}s  {s['rows_per_s'] or 0:>12,.0f} rows/s"
+                      + (f"  peak {s['peak_traced_bytes'] / 1e6:,.1f} MB" if s["peak_traced_bytes"] else ""))
+            print(f"   round trip   {rec['roundtrip_s']:>9.3f}s", flush=True)
+            results.append(rec)
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    report = {"meta": _meta(), "results": results}
+    out = Path(args.out or Path(__file__).resolve().parent / "results" /
+               f"bench-{datetime.datetime.now():%Y%m%d-%H%M%S}.json")
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(report, indent=2), encoding="utf-8")
+    print(f"Results written to {out}")
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+        regressions = compare(report, baseline, args.max_regression, args.min_seconds)
+        if regressions:
+            print(f"\n{len(regressions)} metric(s) regressed beyond x{args.max_regression}:")
+            print("\n".join(regressions))
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
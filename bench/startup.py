@@ -0,0 +1,114 @@
+"""
+Cold-start benchmark: time from launching uvicorn to a healthy /health.
+
+Each run starts a fresh server process, polls /health until it answers 200
+and then sends one small upload, the first request that needs pandas. The
+server stores that session in a temporary directory, removed after the run.
+The import of ``main`` is also timed on its own, with a check that it did not
+pull in pandas or NumPy.
+
+    python -m bench.startup --runs 5
+    python -m bench.startup --runs 5 --workers 2 --budget-ms 1500 --out startup.json
+"""
+from typing import Any, Dict, List, Optional
+from pathlib import Path
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from bench.common import ROOT, LocalServer
+
+_IMPORT_PROBE = (
+    "import sys, time, json\n"
+    "t = time.perf_counter()\n"
+    "import main\n"
+    "print(json.dumps({'import_s': time.perf_counter() - t,\n"
+    "                  'pandas_loaded': 'pandas' in sys.modules,\n"
+    "                  'numpy_loaded': 'numpy' in sys.modules}))\n"
+)
+
+_SAMPLE_CSV = (
+    "msisdn,tenure_months,arpu,data_mb_30d,voice_min_30d,churn_risk,vas_spend_30d\n"
+    "254700000000,44,11.41,1015.1,186.7,0.204,0.0\n"
+    "254700000001,15,10.9,1822.3,135.3,0.354,0.0\n"
+).encode("utf-8")
+
+
+def measure_import() -> Dict[str, Any]:
+    out = subprocess.run([sys.executable, "-c", _IMPORT_PROBE], cwd=str(ROOT), capture_output=True,
+                         text=True, check=True, env=dict(os.environ, PYTHONDONTWRITEBYTECODE="1"))
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def measure_boot(workers: int, timeout: float, poll_s: float) -> Dict[str, Any]:
+    import httpx
+
+    server = LocalServer(workers, quiet=True).start()
+    try:
+        healthy_s = server.wait_healthy(timeout, poll_s)
+        with httpx.Client(base_url=server.url, timeout=60.0) as client:
+            t1 = time.perf_counter()
+            r = client.post("/api/upload", files={"file": ("base.csv", _SAMPLE_CSV, "text/csv")})
+            first_compute_s = time.perf_counter() - t1
+            if r.status_code != 200:
+                raise RuntimeError(f"first upload failed: {r.status_code} {r.text[:200]}")
+        return {"healthy_s": round(healthy_s, 4), "first_compute_s": round(first_compute_s, 4)}
+    finally:
+        server.stop()
+
+
+def _stats(values: List[float]) -> Dict[str, float]:
+    return {"min": round(min(values), 4), "median": round(statistics.median(values), 4),
+            "max": round(max(values), 4)}
+
+
+def main(argv: Optional[list] = None) -> int:
+    ap = argparse.ArgumentParser(description="Measure NiYA-X cold start (process launch to healthy /health).")
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--workers", type=int, default=1, help="uvicorn workers per run")
+    ap.add_argument("--timeout", type=float, default=60.0, help="Seconds to wait for /health per run")
+    ap.add_argument("--poll-ms", type=float, default=10.0, help="/health polling interval")
+    ap.add_argument("--budget-ms", type=float, default=None,
+                    help="Exit non-zero if the median time to healthy exceeds this")
+    ap.add_argument("--out", default=None, help="Write the results as JSON here")
+    args = ap.parse_args(argv)
+
+    imports = [measure_import() for _ in range(args.runs)]
+    print(f"import main: median {statistics.median(i['import_s'] for i in imports) * 1000:.0f} ms, "
+          f"pandas at import: {any(i['pandas_loaded'] for i in imports)}, "
+          f"numpy at import: {any(i['numpy_loaded'] for i in imports)}", flush=True)
+
+    boots = []
+    for i in range(args.runs):
+        b = measure_boot(args.workers, args.timeout, args.poll_ms / 1000.0)
+        boots.append(b)
+        print(f"run {i + 1}: healthy after {b['healthy_s'] * 1000:.0f} ms, "
+              f"first upload {b['first_compute_s'] * 1000:.0f} ms", flush=True)
+
+    report = {
+        "config": {"runs": args.runs, "workers": args.workers, "python": sys.version.split()[0]},
+        "import_s": _stats([i["import_s"] for i in imports]),
+        "pandas_at_import": any(i["pandas_loaded"] for i in imports),
+        "numpy_at_import": any(i["numpy_loaded"] for i in imports),
+        "healthy_s": _stats([b["healthy_s"] for b in boots]),
+        "first_compute_s": _stats([b["first_compute_s"] for b in boots]),
+        "runs": boots,
+    }
+    h = report["healthy_s"]
+    print(f"\ntime to healthy: min {h['min'] * 1000:.0f} ms, median {h['median'] * 1000:.0f} ms, "
+          f"max {h['max'] * 1000:.0f} ms")
+    if args.out:
+        Path(args.out).write_text(json.dumps(report, indent=2), encoding="utf-8")
+        print(f"Report written to {args.out}")
+    if args.budget_ms is not None and h["median"] * 1000 > args.budget_ms:
+        print(f"❌ median {h['median'] * 1000:.0f} ms is over the {args.budget_ms:.0f} ms budget")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
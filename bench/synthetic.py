@@ -0,0 +1,109 @@
+"""
+Reproducible synthetic subscriber base.
+
+Produces the columns the pipeline reads (msisdn, tenure_months, arpu,
+data_mb_30d, voice_min_30d, churn_risk, vas_spend_30d) with telecom-like
+distributions: a cohort of brand-new users, long-tailed ARPU, zero-inflated
+usage that scales with ARPU, and churn risk that falls with tenure.
+
+    python -m bench.synthetic --rows 1000000 --out base_1m.csv
+"""
+from typing import Iterator, Optional
+from pathlib import Path
+import argparse
+import numpy as np
+import pandas as pd
+
+PRESET_SIZES = {"10k": 10_000, "100k": 100_000, "1m": 1_000_000, "10m": 10_000_000}
+SIZE_SUFFIXES = {"k": 1_000, "m": 1_000_000}
+
+MSISDN_BASE = 254_700_000_000
+CHUNK_ROWS = 500_000
+
+
+def parse_size(s: str) -> int:
+    """Row count from '50000', '50_000', '20k' or '1.5m'."""
+    key = s.strip().lower().replace("_", "")
+    if key in PRESET_SIZES:
+        return PRESET_SIZES[key]
+    if key[-1:] in SIZE_SUFFIXES:
+        try:
+            return int(round(float(key[:-1]) * SIZE_SUFFIXES[key[-1]]))
+        except ValueError:
+            pass
+    try:
+        return int(key)
+    except ValueError:
+        raise ValueError(f"invalid size {s!r}: use a row count such as 50000, 20k or 1.5m") from None
+
+
+def _chunk(rng: np.random.Generator, msisdn: np.ndarray) -> pd.DataFrame:
+    n = len(msisdn)
+
+    # ~8% of the base joined in the last two months, the rest has a long tenure tail
+    new = rng.random(n) < 0.08
+    tenure = np.where(new, rng.integers(0, 3, n), np.minimum(3 + rng.gamma(1.6, 16.0, n), 180)).astype(int)
+
+    arpu = np.round(rng.lognormal(mean=np.log(9.0), sigma=0.65, size=n), 2)
+    value = arpu / 9.0
+
+    data_user = rng.random(n) >= 0.18
+    data = np.where(data_user, rng.lognormal(np.log(1800.0), 1.1, n) * value, 0.0)
+
+    voice_user = rng.random(n) >= 0.10
+    voice = np.where(voice_user, rng.lognormal(np.log(160.0), 0.9, n) * np.sqrt(value), 0.0)
+
+    vas_user = rng.random(n) >= 0.55
+    vas = np.where(vas_user, np.minimum(rng.gamma(1.5, 0.08, n), 0.6) * arpu, 0.0)
+
+    # Churn: Beta-shaped, higher for short tenure and for inactive users
+    churn = rng.beta(2.0, 5.5, n) + 0.25 * np.exp(-tenure / 6.0) + 0.20 * (~data_user & ~voice_user)
+    churn = np.clip(churn, 0.0, 1.0)
+
+    return pd.DataFrame({
+        "msisdn": msisdn.astype(str),
+        "tenure_months": tenure,
+        "arpu": arpu,
+        "data_mb_30d": np.round(data, 1),
+        "voice_min_30d": np.round(voice, 1),
+        "churn_risk": np.round(churn, 3),
+        "vas_spend_30d": np.round(vas, 2),
+    })
+
+
+def iter_base(rows: int, seed: int = 42, chunk_rows: int = CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    """Yield the base in chunks so 10M-row files never sit in memory at once."""
+    rng = np.random.default_rng(seed)
+    ids = MSISDN_BASE + rng.permutation(rows).astype(np.int64)
+    for start in range(0, rows, chunk_rows):
+        yield _chunk(rng, ids[start:start + chunk_rows])
+
+
+def generate_base(rows: int, seed: int = 42) -> pd.DataFrame:
+    """Whole base as one DataFrame; identical to concatenating iter_base()."""
+    return pd.concat(list(iter_base(rows, seed)), ignore_index=True)
+
+
+def write_csv(rows: int, out: Path, seed: int = 42) -> Path:
+    out = Path(out)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    for i, chunk in enumerate(iter_base(rows, seed)):
+        chunk.to_csv(out, index=False, mode="w" if i == 0 else "a", header=(i == 0))
+    return out
+
+
+def main(argv: Optional[list] = None):
+    ap = argparse.ArgumentParser(description="Generate a synthetic subscriber base CSV.")
+    ap.add_argument("--rows", default="100k", help="Row count, with optional k/m suffix (e.g. 20k, 1.5m)")
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--out", default=None, help="Output CSV (default: base_<rows>.csv)")
+    args = ap.parse_args(argv)
+
+    rows = parse_size(args.rows)
+    out = Path(args.out or f"base_{args.rows.lower()}.csv")
+    write_csv(rows, out, args.seed)
+    print(f"Wrote {rows:,} rows to {out}")
+
+
+if __name__ == "__main__":
+    main()
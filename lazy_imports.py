@@ -0,0 +1,57 @@
+"""
+Deferred imports of the numeric stack.
+
+pandas and NumPy take a few hundred milliseconds to import, which is most of
+a cold start. ``pd`` and ``np`` below are stand-ins that import the real
+module on first attribute access, so a worker reaches its health check
+without them and pays the cost on the first compute request instead.
+
+pandas is configured here, once, when it is first loaded. Code that hands
+data to a library that imports pandas by itself (pyarrow's ``to_pandas``)
+calls ``pd.load()`` first so the configuration is always in place.
+"""
+from types import ModuleType
+from typing import Any, Callable, Optional
+import importlib
+import threading
+
+
+class LazyModule:
+    def __init__(self, name: str, on_import: Optional[Callable[[ModuleType], None]] = None):
+        self._name = name
+        self._on_import = on_import
+        self._module: Optional[ModuleType] = None
+        self._lock = threading.Lock()
+
+    def load(self) -> ModuleType:
+        module = self._module
+        if module is None:
+            with self._lock:
+                if self._module is None:
+                    module = importlib.import_module(self._name)
+                    if self._on_import is not None:
+                        self._on_import(module)
+                    self._module = module
+                module = self._module
+        return module
+
+    @property
+    def loaded(self) -> bool:
+        return self._module is not None
+
+    def __getattr__(self, attr: str) -> Any:
+        return getattr(self._module or self.load(), attr)
+
+    def __repr__(self) -> str:
+        state = "loaded" if self._module is not None else "not loaded"
+        return f"<lazy module {self._name!r} ({state})>"
+
+
+def _configure_pandas(pandas: ModuleType) -> None:
+    # Copy-on-write: derived frames share column buffers with their parent until
+    # a column is actually modified, so adding columns never duplicates the base.
+    pandas.set_option("mode.copy_on_write", True)
+
+
+pd = LazyModule("pandas", on_import=_configure_pandas)
+np = LazyModule("numpy")
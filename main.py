@@ -1,63 +1,51 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException
-from fastapi.responses import FileResponse, JSONResponse, HTMLResponse
+from __future__ import annotations
+
+from fastapi import FastAPI, UploadFile, File, HTTPException, Request
+from fastapi.responses import FileResponse, JSONResponse, HTMLResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
+from starlette.routing import Mount
 from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
 from pathlib import Path
-import pandas as pd
-import numpy as np
 import io, os, uuid, time, datetime, hashlib
 import traceback
 import logging
 import json
+import cProfile, pstats
+import functools
+import threading
+import asyncio
+from concurrent.futures import Future
+import metrics
+from session_store import SessionStore
+from publisher import PublishEngine
+# pandas/NumPy load on first use (first compute request), not at import
+from lazy_imports import pd, np
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 APP_TITLE = "NiYA-X | Intelligence On-Demand"
+# Artificial pause per run_step so the UI animation is visible; benchmarks set it to 0
+STEP_DELAY_S = float(os.environ.get("NIYAX_STEP_DELAY_S", "1.0"))
 app = FastAPI(title=APP_TITLE)
 
 # -------------------------
-# Paths - More robust handling
+# Paths
 # -------------------------
+# Resolved once; nothing is probed or created at import. Directories that the
+# app writes to are created on first write (see SessionStore and _write_launch).
 BASE_DIR = Path(__file__).resolve().parent
 PROJECT_ROOT = BASE_DIR
+STATIC_DIR = Path(os.environ.get("NIYAX_STATIC_DIR") or BASE_DIR / "static")
+# NIYAX_DATA_DIR / NIYAX_RUNTIME_DIR move the stores elsewhere (benchmarks use a temp dir)
+RUNTIME_DIR = Path(os.environ.get("NIYAX_RUNTIME_DIR") or BASE_DIR / "runtime")
 
-# Try multiple possible locations for static directory
-STATIC_DIR = None
-possible_static_dirs = [
-    BASE_DIR / "static",
-    PROJECT_ROOT / "static",
-    Path.cwd() / "static",
-    Path("/app") / "static",
-    Path("/app") / "niyax-complete" / "static"
-]
-
-for dir_path in possible_static_dirs:
-    if dir_path.exists():
-        STATIC_DIR = dir_path
-        logger.info(f"✅ Found static directory at: {STATIC_DIR}")
-        break
-
-if STATIC_DIR is None:
-    logger.warning("⚠️ Static directory not found, creating at default location")
-    STATIC_DIR = BASE_DIR / "static"
-    STATIC_DIR.mkdir(parents=True, exist_ok=True)
-
-# Create subdirectories
-(STATIC_DIR / "css").mkdir(parents=True, exist_ok=True)
-(STATIC_DIR / "js").mkdir(parents=True, exist_ok=True)
-(STATIC_DIR / "assets").mkdir(parents=True, exist_ok=True)
-
-RUNTIME_DIR = BASE_DIR / "runtime"
-RUNTIME_DIR.mkdir(parents=True, exist_ok=True)
-
-DATA_DIR = BASE_DIR / "data"
+DATA_DIR = Path(os.environ.get("NIYAX_DATA_DIR") or BASE_DIR / "data")
 SESS_DIR = DATA_DIR / "sessions"
 SESS_FILE = DATA_DIR / "sessions.json"
-SESS_DIR.mkdir(parents=True, exist_ok=True)
-DATA_DIR.mkdir(parents=True, exist_ok=True)
+SESS_DB = DATA_DIR / "sessions.db"
 
 # Mount static files
 try:
@@ -170,7 +158,74 @@ def health_check():
 # -------------------------
 # Sessions
 # -------------------------
-SESSIONS: Dict[str, Dict[str, Any]] = {}
+# Shared across uvicorn workers: SQLite index + memory-mapped Arrow frames on disk.
+# Each worker keeps the most recently used sessions in memory; sessions not
+# saved for SESSION_TTL_S are deleted (0 keeps them forever).
+SESSION_CACHE_SIZE = int(os.environ.get("NIYAX_SESSION_CACHE_SIZE", "16"))
+SESSION_TTL_S = float(os.environ.get("NIYAX_SESSION_TTL_HOURS", "24")) * 3600
+SESSION_SWEEP_EVERY_S = 3600
+SESSIONS = SessionStore(SESS_DB, SESS_DIR, cache_size=SESSION_CACHE_SIZE)
+
+PUBLISHER = PublishEngine(
+    SESS_DB,
+    batch_size=int(os.environ.get("NIYAX_PUBLISH_BATCH_SIZE", "5000")),
+    concurrency=int(os.environ.get("NIYAX_PUBLISH_CONCURRENCY", "4")),
+    max_retries=int(os.environ.get("NIYAX_PUBLISH_MAX_RETRIES", "5")),
+)
+
+# -------------------------
+# Metrics
+# -------------------------
+STEP_SECONDS = metrics.Histogram("niyax_step_duration_seconds", "Wall time of run_step by step.", ["step"])
+STEP_ROWS = metrics.Counter("niyax_step_rows_total", "Subscriber rows processed by run_step.", ["step"])
+STEP_ROWS_PER_SEC = metrics.Gauge("niyax_step_rows_per_second", "Throughput of the last run of each step.", ["step"])
+# RSS-based, so memory a warm worker already holds is reused and not counted; the
+# cost of a step on its own is checked in a fresh process by bench.memory
+STEP_RSS_GROWTH = metrics.Gauge("niyax_step_rss_growth_bytes",
+                                "How far worker RSS rose above its level at the start of the last run of each step "
+                                "(overlapping runs in one worker share the peak).", ["step"])
+STEP_ERRORS = metrics.Counter("niyax_step_errors_total", "Failed run_step calls.", ["step"])
+STEP_COALESCED = metrics.Counter("niyax_step_coalesced_total", "run_step calls answered by an identical in-flight run.", ["step"])
+STEPS_IN_FLIGHT = metrics.Gauge("niyax_steps_in_flight", "run_step calls currently executing.", ["step"],
+                                multiprocess_mode="livesum")
+DELTA_UPLOADS = metrics.Counter("niyax_delta_uploads_total", "Delta uploads applied, by recompute mode.", ["mode"])
+FORECAST_CACHE = metrics.Counter("niyax_forecast_cache_total", "impact_forecast cache lookups.", ["result"])
+SESSIONS_GAUGE = metrics.Gauge("niyax_sessions", "Sessions held in the session store.", multiprocess_mode="local")
+SESSION_BYTES = metrics.Gauge("niyax_session_store_bytes", "On-disk bytes of session frames in the shared store.",
+                              multiprocess_mode="local")
+HTTP_SECONDS = metrics.Histogram("niyax_http_request_duration_seconds", "Endpoint latency.", ["method", "route", "status"])
+
+def _collect_session_metrics():
+    SESSIONS_GAUGE.set(value=len(SESSIONS))
+    SESSION_BYTES.set(value=SESSIONS.total_frame_bytes())
+
+metrics.register_collector(_collect_session_metrics)
+
+def _route_label(request: Request) -> str:
+    """Route template of a request, the mount path for mounted apps (/static), else "unmatched"."""
+    route = request.scope.get("route")
+    if getattr(route, "path", None):
+        return route.path
+    endpoint = request.scope.get("endpoint")
+    for mount in app.routes:
+        if isinstance(mount, Mount) and endpoint is not None and mount.app is endpoint:
+            return mount.path
+    return "unmatched"
+
+@app.middleware("http")
+async def _record_latency(request: Request, call_next):
+    t0 = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        HTTP_SECONDS.observe(request.method, _route_label(request), str(status), value=time.perf_counter() - t0)
+
+@app.get("/metrics")
+def metrics_endpoint():
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
 
 # -------------------------
 # Models
@@ -182,12 +237,14 @@ class StepRequest(BaseModel):
     opportunity_types: Optional[List[str]] = None
     offer_count: Optional[int] = 3  # Legacy: Number of offers per LOB
     offer_counts_per_opp: Optional[Dict[str, int]] = None  # New: Number of offers per opportunity type
+    profile: Optional[str] = None  # "cprofile" or "pyinstrument": attach a profile report to the response
 
 class PublishRequest(BaseModel):
     session_id: str
     target: str = "NEON_DX"
     mode: str = "api"
     endpoint_url: Optional[str] = None
+    resume: bool = True  # continue an interrupted/failed job from its checkpoint
 
 # -------------------------
 # Utils
@@ -200,39 +257,43 @@ def _require_session(session_id: str) -> Dict[str, Any]:
         raise HTTPException(status_code=404, detail="Session not found. Please upload again.")
     return SESSIONS[session_id]
 
-def _save_sessions():
-    """Save sessions to JSON file - SAFE VERSION"""
+def _save_session(session_id: str):
+    """Persist a session mutated in this worker so other workers see it"""
     try:
-        logger.info(f"Session state: {len(SESSIONS)} active sessions")
+        SESSIONS.save(session_id)
     except Exception as e:
-        logger.error(f"Error in save_sessions: {e}")
+        logger.error(f"Error saving session {session_id}: {e}")
+        raise
 
 def _load_sessions():
-    """Load sessions from JSON file - SAFE VERSION"""
-    global SESSIONS
+    """Open the shared session store and clean up after an unclean shutdown - SAFE VERSION"""
     try:
         if SESS_FILE.exists():
-            try:
-                with open(SESS_FILE, "r", encoding="utf-8") as f:
-                    content = f.read().strip()
-                    if content:
-                        loaded = json.loads(content)
-                        logger.info(f"Found existing sessions file, starting fresh session storage")
-                    else:
-                        logger.info("Sessions file is empty, starting fresh")
-            except json.JSONDecodeError as e:
-                logger.warning(f"⚠️ Corrupted sessions file, deleting and starting fresh: {e}")
-                SESS_FILE.unlink()
-                SESSIONS = {}
-            except Exception as e:
-                logger.warning(f"⚠️ Could not load sessions: {e}, starting fresh")
-                SESSIONS = {}
-        else:
-            logger.info("No existing sessions file, starting fresh")
-            SESSIONS = {}
+            # Pre-store sessions file: its frames were never persisted, nothing to recover
+            logger.info("Found legacy sessions file, removing it")
+            SESS_FILE.unlink()
+        _sweep_sessions()
+        count = SESSIONS.recover()
+        logger.info(f"📊 Recovered {count} sessions from {SESS_DB}")
     except Exception as e:
         logger.error(f"Error in load_sessions: {e}")
-        SESSIONS = {}
+
+def _sweep_sessions():
+    """Delete expired sessions and their launch files"""
+    if SESSION_TTL_S <= 0:
+        return
+    for meta in SESSIONS.sweep(SESSION_TTL_S):
+        path = meta.get("output_path")
+        if path:
+            Path(path).unlink(missing_ok=True)
+
+async def _sweep_sessions_periodically():
+    while True:
+        await asyncio.sleep(SESSION_SWEEP_EVERY_S)
+        try:
+            await asyncio.to_thread(_sweep_sessions)
+        except Exception as e:
+            logger.error(f"Error sweeping sessions: {e}")
 
 def _hash01(*parts: str) -> float:
     s = "|".join([str(p) for p in parts])
@@ -264,7 +325,9 @@ def _normalize_lobs(lobs: Optional[List[str]]) -> List[str]:
     return out if out else ["DATA", "VOICE", "VAS"]
 
 def _ensure_columns(df: pd.DataFrame) -> pd.DataFrame:
-    df = df.copy()
+    # Shallow copy (CoW): new columns land on this frame only, the caller's
+    # frame and its buffers are left untouched.
+    df = df.copy(deep=False)
     if "msisdn" not in df.columns:
         df.rename(columns={df.columns[0]: "msisdn"}, inplace=True)
 
@@ -279,25 +342,34 @@ def _ensure_columns(df: pd.DataFrame) -> pd.DataFrame:
         df["vas_spend_30d"] = np.round(arpu * (rnd * 0.25), 2)
     return df
 
-def _overall_usage(df: pd.DataFrame) -> pd.Series:
+USAGE_COLUMNS = ("data_mb_30d", "voice_min_30d", "vas_spend_30d")
+
+def _usage_stats(df: pd.DataFrame) -> Dict[str, float]:
+    """Column maxima _overall_usage normalizes by (tracked per session for delta uploads)"""
+    return {c: float(pd.to_numeric(df[c], errors="coerce").fillna(0.0).max()) for c in USAGE_COLUMNS}
+
+def _overall_usage(df: pd.DataFrame, stats: Optional[Dict[str, float]] = None) -> pd.Series:
+    stats = stats or _usage_stats(df)
     d = pd.to_numeric(df["data_mb_30d"], errors="coerce").fillna(0.0)
     v = pd.to_numeric(df["voice_min_30d"], errors="coerce").fillna(0.0)
     vas = pd.to_numeric(df["vas_spend_30d"], errors="coerce").fillna(0.0)
-    d_n = d / (float(d.max()) if float(d.max()) != 0 else 1.0)
-    v_n = v / (float(v.max()) if float(v.max()) != 0 else 1.0)
-    vas_n = vas / (float(vas.max()) if float(vas.max()) != 0 else 1.0)
+    d_n = d / (stats["data_mb_30d"] if stats["data_mb_30d"] != 0 else 1.0)
+    v_n = v / (stats["voice_min_30d"] if stats["voice_min_30d"] != 0 else 1.0)
+    vas_n = vas / (stats["vas_spend_30d"] if stats["vas_spend_30d"] != 0 else 1.0)
     return 0.5 * d_n + 0.35 * v_n + 0.15 * vas_n
 
-def _sample_df(df: pd.DataFrame, max_rows: int = 200000) -> pd.DataFrame:
+SAMPLE_MAX_ROWS = 200000
+
+def _sample_df(df: pd.DataFrame, max_rows: int = SAMPLE_MAX_ROWS) -> pd.DataFrame:
     if int(df.shape[0]) <= max_rows:
         return df
     return df.sample(n=max_rows, random_state=123).reset_index(drop=True)
 
-def _derive_lifecycle_stage(df: pd.DataFrame) -> pd.DataFrame:
-    df = _ensure_columns(df).copy()
+def _derive_lifecycle_stage(df: pd.DataFrame, stats: Optional[Dict[str, float]] = None) -> pd.DataFrame:
+    df = _ensure_columns(df)
     tenure = pd.to_numeric(df["tenure_months"], errors="coerce").fillna(6.0)
     churn = pd.to_numeric(df["churn_risk"], errors="coerce").fillna(0.2)
-    usage = _overall_usage(df)
+    usage = _overall_usage(df, stats)
 
     non_user = usage <= 0.08
     prev_factor = np.array([0.7 + 0.9 * _hash01(m, "prev") for m in df["msisdn"].astype(str)])
@@ -408,11 +480,13 @@ def _opportunity_name(strategy: str, lob: str) -> str:
     if s == "noaction": s = "noaction"
     return f"{s}_{lob}"
 
-def _premium_reason(row: pd.Series, strategy: str, lob: str) -> str:
-    churn = float(pd.to_numeric(row.get("churn_risk", 0.2), errors="coerce") or 0.2)
-    arpu = float(pd.to_numeric(row.get("arpu", 10.0), errors="coerce") or 10.0)
-    tenure = float(pd.to_numeric(row.get("tenure_months", 6), errors="coerce") or 6)
-    
+def _reason_inputs(df: pd.DataFrame, col: str, default: float) -> List[float]:
+    """Per-row numeric input of _premium_reason (zero counts as missing, like the row lookup did)"""
+    if col not in df.columns:
+        return [float(default)] * len(df)
+    return [float(v or default) for v in pd.to_numeric(df[col], errors="coerce").tolist()]
+
+def _premium_reason(strategy: str, lob: str, churn: float = 0.2, arpu: float = 10.0, tenure: float = 6) -> str:
     lob_lower = lob.lower()
     if strategy == "Retain":
         return f"High churn risk ({churn:.1%}) in {lob_lower}. Recommend loyalty offer to prevent revenue loss."
@@ -486,7 +560,7 @@ async def upload(file: UploadFile = File(...)):
         session_id = str(uuid.uuid4())
         rows, cols = df.shape[0], df.shape[1]
 
-        SESSIONS[session_id] = {
+        sess = {
             "raw": df,
             "raw_rows": rows,
             "raw_cols": cols,
@@ -496,6 +570,8 @@ async def upload(file: UploadFile = File(...)):
             "output_path": None,
             "created_at": _now()
         }
+        # Writes the Arrow frame and takes the SQLite write lock: keep it off the event loop
+        await asyncio.to_thread(SESSIONS.__setitem__, session_id, sess)
         
         logger.info(f"✅ Session created: {session_id} ({rows} rows, {cols} cols)")
         
@@ -513,179 +589,477 @@ async def upload(file: UploadFile = File(...)):
         logger.error(traceback.format_exc())
         raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
 
+def _profile_call(kind: str, fn, *args):
+    """Run fn under the requested profiler; returns (result, text report)."""
+    if kind == "pyinstrument":
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            raise HTTPException(status_code=400, detail="pyinstrument is not installed on this server.")
+        profiler = Profiler()
+        profiler.start()
+        try:
+            result = fn(*args)
+        finally:
+            profiler.stop()
+        return result, profiler.output_text(unicode=True, color=False)
+
+    profiler = cProfile.Profile()
+    try:
+        result = profiler.runcall(fn, *args)
+    finally:
+        buf = io.StringIO()
+        pstats.Stats(profiler, stream=buf).sort_stats("cumulative").print_stats(40)
+    return result, buf.getvalue()
+
+def _step_key(req: StepRequest, step: str) -> str:
+    """Identity of a run_step call: same session, step and controls => same result"""
+    payload = req.model_dump()
+    payload["step"] = step
+    return hashlib.sha1(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+# Identical run_step calls in flight in this worker: the first computes, the rest wait on its future
+_INFLIGHT: Dict[str, Future] = {}
+_INFLIGHT_LOCK = threading.Lock()
+
 @app.post("/api/run_step")
 def run_step(req: StepRequest):
     try:
         logger.info(f"🔄 Running step: {req.step} for session {req.session_id}")
         
-        sess = _require_session(req.session_id)
+        _require_session(req.session_id)
         step = (req.step or "").strip().lower()
         if step not in {"lifecycle", "opportunity", "offers", "launch"}:
             raise HTTPException(status_code=400, detail="Invalid step.")
+        profile = (req.profile or "").strip().lower()
+        if profile and profile not in {"cprofile", "pyinstrument"}:
+            raise HTTPException(status_code=400, detail="profile must be 'cprofile' or 'pyinstrument'.")
+
+        return _run_step_coalesced(req, step, profile)
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"❌ Step error: {e}")
+        logger.error(traceback.format_exc())
+        raise HTTPException(status_code=500, detail=f"Step failed: {str(e)}")
 
-        df = _sample_df(sess["raw"], 200000)
-        df = _ensure_columns(df)
-        time.sleep(1.0)
+def _run_step_coalesced(req: StepRequest, step: str, profile: str = "",
+                        delay_s: float = STEP_DELAY_S) -> Dict[str, Any]:
+    """Run a validated step, or wait for an identical one already running in this worker"""
+    key = _step_key(req, step)
+    with _INFLIGHT_LOCK:
+        fut = _INFLIGHT.get(key)
+        leader = fut is None
+        if leader:
+            fut = _INFLIGHT[key] = Future()
+    if not leader:
+        logger.info(f"⏳ Coalescing duplicate {step} request for session {req.session_id}")
+        STEP_COALESCED.inc(step)
+        return dict(fut.result(), coalesced=True)
 
-        if step == "lifecycle":
-            df2 = _derive_lifecycle_stage(df)
-            out = pd.DataFrame({
-                "msisdn": df2["msisdn"].astype(str),
-                "lifecycle_stage": df2["lifecycle_stage"].astype(str)
+    try:
+        result = _run_step_exclusive(req, step, profile, key, delay_s)
+        fut.set_result(result)
+        return result
+    except BaseException as e:
+        fut.set_exception(e)
+        raise
+    finally:
+        with _INFLIGHT_LOCK:
+            _INFLIGHT.pop(key, None)
+
+def _run_step_exclusive(req: StepRequest, step: str, profile: str, key: str,
+                        delay_s: float = STEP_DELAY_S) -> Dict[str, Any]:
+    """Run a step while holding the session lock (serialized across threads and workers)."""
+    arrived = time.time()
+    with SESSIONS.lock(req.session_id):
+        # Re-read under the lock: another worker may have saved a newer version meanwhile
+        sess = _require_session(req.session_id)
+
+        # An identical request finished in another worker while we waited: reuse its result
+        last = sess.get("last_runs", {}).get(step)
+        if last and last.get("key") == key and last.get("finished_at", 0) >= arrived:
+            logger.info(f"⏳ Reusing {step} result computed by another worker for session {req.session_id}")
+            STEP_COALESCED.inc(step)
+            return dict(last["result"], coalesced=True)
+
+        if delay_s > 0:
+            time.sleep(delay_s)
+
+        STEPS_IN_FLIGHT.inc(step)
+        t0 = time.perf_counter()
+        try:
+            with metrics.peak_rss_window() as mem:
+                if profile:
+                    rows, report = _profile_call(profile, _execute_step, req, sess, step)
+                else:
+                    rows, report = _execute_step(req, sess, step), None
+            elapsed = time.perf_counter() - t0
+            result = {"ok": True, "step": step, "elapsed_s": round(elapsed, 4), "rows": rows, "timestamp": _now()}
+            sess.setdefault("last_runs", {})[step] = {"key": key, "finished_at": time.time(), "result": result}
+            _save_session(req.session_id)
+        except Exception:
+            STEP_ERRORS.inc(step)
+            # Discard any half-applied mutation; the next reader reloads the saved state
+            SESSIONS.invalidate(req.session_id)
+            raise
+        finally:
+            STEPS_IN_FLIGHT.dec(step)
+
+    STEP_SECONDS.observe(step, value=elapsed)
+    STEP_ROWS.inc(step, amount=rows)
+    STEP_ROWS_PER_SEC.set(step, value=rows / elapsed if elapsed > 0 else 0.0)
+    STEP_RSS_GROWTH.set(step, value=mem["bytes"])
+
+    logger.info(f"✅ Step completed: {step} ({rows} rows in {elapsed:.3f}s)")
+    if report is not None:
+        result = dict(result, profile=report)
+    return result
+
+def _lifecycle_frame(df: pd.DataFrame, stats: Optional[Dict[str, float]] = None) -> pd.DataFrame:
+    df2 = _derive_lifecycle_stage(df, stats)
+    return pd.DataFrame({
+        "msisdn": df2["msisdn"].astype(str),
+        "lifecycle_stage": df2["lifecycle_stage"].astype(str)
+    })
+
+def _opportunity_frame(df: pd.DataFrame, lobs: List[str], types: List[str],
+                       stats: Optional[Dict[str, float]] = None) -> pd.DataFrame:
+    df2 = _derive_lifecycle_stage(df, stats).reset_index(drop=True)
+    churn = pd.to_numeric(df2["churn_risk"], errors="coerce").fillna(0.2).astype(float).tolist()
+    # Plain lists: per-row .loc lookups are several times slower under copy-on-write
+    stages = df2["lifecycle_stage"].astype(str).tolist()
+    msisdns = df2["msisdn"].astype(str).tolist()
+    reason_churn = _reason_inputs(df2, "churn_risk", 0.2)
+    reason_arpu = _reason_inputs(df2, "arpu", 10.0)
+    reason_tenure = _reason_inputs(df2, "tenure_months", 6)
+
+    rows = []
+    for i in range(len(df2)):
+        lcs = stages[i]
+        base_strategy = _base_strategy_from_lcs(lcs, churn[i])
+
+        for lob in lobs:
+            # Pass LCS to filter so it can determine valid opportunities
+            strategy = _apply_type_filter(base_strategy, types, lcs)
+            opp = _opportunity_name(strategy, lob)
+            rows.append({
+                "msisdn": msisdns[i],
+                "lifecycle_stage": lcs,
+                "lob": _norm_lob(lob),
+                "opportunity": opp,
+                "reason": _premium_reason(strategy, lob, reason_churn[i], reason_arpu[i], reason_tenure[i])
             })
-            sess["steps"]["lifecycle"] = out
-            sess["status"]["lifecycle"] = True
-
-        elif step == "opportunity":
-            if not sess["status"].get("lifecycle"):
-                raise HTTPException(status_code=400, detail="Run Lifecycle step first.")
-            lobs = _normalize_lobs(req.lobs)
-            types = req.opportunity_types or ["Auto"]
-            
-            # ✅ Store the selected LOBs and types
-            sess["controls"] = {"lobs": lobs, "types": types}
-            logger.info(f"✅ Stored controls: LOBs={lobs}, Types={types}")
-
-            df2 = _derive_lifecycle_stage(df)
-            churn = pd.to_numeric(df2["churn_risk"], errors="coerce").fillna(0.2).astype(float)
-
-            rows = []
-            for i in range(len(df2)):
-                lcs = str(df2.loc[i, "lifecycle_stage"])
-                base_strategy = _base_strategy_from_lcs(lcs, float(churn.loc[i]))
-
-                for lob in lobs:
-                    # Pass LCS to filter so it can determine valid opportunities
-                    strategy = _apply_type_filter(base_strategy, types, lcs)
-                    opp = _opportunity_name(strategy, lob)
-                    rows.append({
-                        "msisdn": str(df2.loc[i, "msisdn"]),
-                        "lifecycle_stage": lcs,
-                        "lob": _norm_lob(lob),
-                        "opportunity": opp,
-                        "reason": _premium_reason(df2.loc[i], strategy, lob)
-                    })
-
-            out = pd.DataFrame(rows)
-            sess["steps"]["opportunity"] = out
-            sess["status"]["opportunity"] = True
-
-        elif step == "offers":
-            if not sess["status"].get("opportunity"):
-                raise HTTPException(status_code=400, detail="Run Opportunity step first.")
-
-            opp_df = sess["steps"]["opportunity"].copy()
-            
-            logger.info(f"📋 Opportunity DataFrame has {len(opp_df)} rows")
-            logger.info(f"📋 Opportunity columns: {list(opp_df.columns)}")
-            
-            # ✅ Get the LOBs and types from controls (what was selected in Opportunity)
-            selected_lobs = sess["controls"].get("lobs", [])
-            selected_types = sess["controls"].get("types", ["Auto"])
-            
-            # ✅ Get offer counts per opportunity type (new format)
-            offer_counts_per_opp = req.offer_counts_per_opp or {}
-            
-            # Fallback to legacy offer_count if new format not provided
-            default_count = req.offer_count or 2
-            
-            # Normalize opportunity type keys for matching
-            def normalize_opp_key(key: str) -> str:
-                return key.lower().replace(" ", "").replace("-", "")
-            
-            # Build normalized offer counts dict
-            normalized_counts = {}
-            for opp_type, count in offer_counts_per_opp.items():
-                normalized_counts[normalize_opp_key(opp_type)] = max(1, min(count, 3))
-            
-            logger.info(f"✅ Offer counts per opportunity: {offer_counts_per_opp}")
-            logger.info(f"✅ Normalized counts: {normalized_counts}")
-            logger.info(f"✅ Selected LOBs: {selected_lobs}, Types: {selected_types}")
 
-            # For each MSISDN, generate offers based on their opportunity type
-            rows = []
+    return pd.DataFrame(rows)
+
+def _normalize_opp_key(key: str) -> str:
+    return key.lower().replace(" ", "").replace("-", "")
+
+def _offers_frame(opp_df: pd.DataFrame, selected_lobs: List[str], offer_counts_per_opp: Dict[str, int],
+                  default_count: int) -> pd.DataFrame:
+    # Build normalized offer counts dict
+    normalized_counts = {}
+    for opp_type, count in offer_counts_per_opp.items():
+        normalized_counts[_normalize_opp_key(opp_type)] = max(1, min(count, 3))
+
+    logger.info(f"✅ Offer counts per opportunity: {offer_counts_per_opp}")
+    logger.info(f"✅ Normalized counts: {normalized_counts}")
+
+    # For each MSISDN, generate offers based on their opportunity type
+    rows = []
+    
+    # Check if opp_df has required columns
+    if "msisdn" not in opp_df.columns or "lifecycle_stage" not in opp_df.columns:
+        logger.error(f"❌ Missing required columns. Available: {list(opp_df.columns)}")
+        raise HTTPException(status_code=500, detail="Opportunity data is missing required columns")
+    
+    # First opportunity per MSISDN/lifecycle group and LOB, collected from plain
+    # lists: a pandas mask per group costs more than the offers (more so under copy-on-write)
+    keyed = opp_df[opp_df[["msisdn", "lifecycle_stage"]].notna().all(axis=1)]
+    groups: Dict[tuple, Dict[str, Any]] = {}
+    for msisdn, lcs, lob, opp in zip(keyed["msisdn"].tolist(), keyed["lifecycle_stage"].tolist(),
+                                     keyed["lob"].tolist(), keyed["opportunity"].tolist()):
+        groups.setdefault((msisdn, lcs), {}).setdefault(lob, opp)
+    logger.info(f"📋 Found {len(groups)} unique MSISDN/lifecycle groups")
+
+    for msisdn, lcs in sorted(groups):
+        row = {"msisdn": msisdn, "lifecycle_stage": lcs}
+        group_opps = groups[(msisdn, lcs)]
+
+        # Iterate over SELECTED LOBs from Opportunity step
+        for lob in selected_lobs:
+            if lob not in group_opps:
+                logger.warning(f"⚠️ LOB {lob} not found in opportunity data for {msisdn}")
+                continue
             
-            # Check if opp_df has required columns
-            if "msisdn" not in opp_df.columns or "lifecycle_stage" not in opp_df.columns:
-                logger.error(f"❌ Missing required columns. Available: {list(opp_df.columns)}")
-                raise HTTPException(status_code=500, detail="Opportunity data is missing required columns")
+            opp = group_opps[lob]
+            strategy = _strategy_from_opportunity(opp)
             
-            grouped = opp_df.groupby(["msisdn", "lifecycle_stage"])
-            logger.info(f"📋 Found {len(grouped)} unique MSISDN/lifecycle groups")
-
-            for (msisdn, lcs), g in grouped:
-                row = {"msisdn": msisdn, "lifecycle_stage": lcs}
-
-                # Iterate over SELECTED LOBs from Opportunity step
-                for lob in selected_lobs:
-                    gg = g[g["lob"] == lob]
-                    if gg.empty:
-                        logger.warning(f"⚠️ LOB {lob} not found in opportunity data for {msisdn}")
-                        continue
-                    
-                    opp = gg.iloc[0]["opportunity"]
-                    strategy = _strategy_from_opportunity(opp)
-                    
-                    # Get offer count for this opportunity type
-                    strategy_key = normalize_opp_key(strategy)
-                    offer_count = normalized_counts.get(strategy_key, default_count)
-                    
-                    logger.debug(f"  MSISDN {msisdn}, LOB {lob}, Strategy {strategy}, Count {offer_count}")
-                    
-                    # Generate offers
-                    offers = _pick_offers(msisdn, lob, strategy, offer_count)
-                    
-                    row[f"opportunity_{lob.lower()}"] = opp
-                    
-                    # Create offer columns based on the count for this opportunity type
-                    for i in range(offer_count):
-                        row[f"{lob.lower()}_offer{i+1}"] = offers[i]
-
-                rows.append(row)
-
-            logger.info(f"📋 Generated {len(rows)} offer rows")
+            # Get offer count for this opportunity type
+            strategy_key = _normalize_opp_key(strategy)
+            offer_count = normalized_counts.get(strategy_key, default_count)
             
-            if len(rows) == 0:
-                logger.warning("⚠️ No offer rows generated! Creating empty DataFrame with expected columns")
-                # Create empty DataFrame with expected columns
-                columns = ["msisdn", "lifecycle_stage"]
-                for lob in selected_lobs:
-                    lob_lower = lob.lower()
-                    columns.append(f"opportunity_{lob_lower}")
-                    for i in range(default_count):
-                        columns.append(f"{lob_lower}_offer{i+1}")
-                out = pd.DataFrame(columns=columns)
-            else:
-                out = pd.DataFrame(rows)
+            logger.debug(f"  MSISDN {msisdn}, LOB {lob}, Strategy {strategy}, Count {offer_count}")
             
-            sess["steps"]["offers"] = out
-            sess["status"]["offers"] = True
+            # Generate offers
+            offers = _pick_offers(msisdn, lob, strategy, offer_count)
             
-            # Store the offer configuration for reference
-            sess["controls"]["offer_counts"] = offer_counts_per_opp
+            row[f"opportunity_{lob.lower()}"] = opp
             
-            logger.info(f"✅ Generated {len(out)} offer rows with variable offers per opportunity type")
-            logger.info(f"✅ Offer DataFrame columns: {list(out.columns)}")
-
-        elif step == "launch":
-            if not sess["status"].get("offers"):
-                raise HTTPException(status_code=400, detail="Run Offers step first.")
-            final_df = sess["steps"]["offers"].copy()
-            out_path = str(RUNTIME_DIR / f"output_{req.session_id}.csv")
-            final_df.to_csv(out_path, index=False)
-            sess["steps"]["launch"] = final_df
-            sess["status"]["launch"] = True
-            sess["output_path"] = out_path
-
-        logger.info(f"✅ Step completed: {step}")
-        return {"ok": True, "step": step, "timestamp": _now()}
+            # Create offer columns based on the count for this opportunity type
+            for i in range(offer_count):
+                row[f"{lob.lower()}_offer{i+1}"] = offers[i]
+
+        rows.append(row)
+
+    logger.info(f"📋 Generated {len(rows)} offer rows")
+    
+    if len(rows) == 0:
+        logger.warning("⚠️ No offer rows generated! Creating empty DataFrame with expected columns")
+        # Create empty DataFrame with expected columns
+        columns = ["msisdn", "lifecycle_stage"]
+        for lob in selected_lobs:
+            lob_lower = lob.lower()
+            columns.append(f"opportunity_{lob_lower}")
+            for i in range(default_count):
+                columns.append(f"{lob_lower}_offer{i+1}")
+        return pd.DataFrame(columns=columns)
+    return pd.DataFrame(rows)
+
+def _write_launch(sess: Dict[str, Any], session_id: str):
+    final_df = sess["steps"]["offers"]
+    RUNTIME_DIR.mkdir(parents=True, exist_ok=True)
+    out_path = str(RUNTIME_DIR / f"output_{session_id}.csv")
+    final_df.to_csv(out_path, index=False)
+    sess["steps"]["launch"] = final_df
+    sess["status"]["launch"] = True
+    sess["output_path"] = out_path
+
+def _execute_step(req: StepRequest, sess: Dict[str, Any], step: str) -> int:
+    """Run one pipeline step against the session; returns the number of input rows processed."""
+    df = _sample_df(sess["raw"], SAMPLE_MAX_ROWS)
+    df = _ensure_columns(df)
+
+    if step == "lifecycle":
+        stats = _usage_stats(df)
+        sess["steps"]["lifecycle"] = _lifecycle_frame(df, stats)
+        sess["status"]["lifecycle"] = True
+        sess["stats"] = stats
+
+    elif step == "opportunity":
+        if not sess["status"].get("lifecycle"):
+            raise HTTPException(status_code=400, detail="Run Lifecycle step first.")
+        lobs = _normalize_lobs(req.lobs)
+        types = req.opportunity_types or ["Auto"]
+        
+        # ✅ Store the selected LOBs and types
+        sess["controls"] = {"lobs": lobs, "types": types}
+        logger.info(f"✅ Stored controls: LOBs={lobs}, Types={types}")
+
+        stats = _usage_stats(df)
+        sess["steps"]["opportunity"] = _opportunity_frame(df, lobs, types, stats)
+        sess["status"]["opportunity"] = True
+        sess["stats"] = stats
+
+    elif step == "offers":
+        if not sess["status"].get("opportunity"):
+            raise HTTPException(status_code=400, detail="Run Opportunity step first.")
+
+        opp_df = sess["steps"]["opportunity"]
+        
+        logger.info(f"📋 Opportunity DataFrame has {len(opp_df)} rows")
+        logger.info(f"📋 Opportunity columns: {list(opp_df.columns)}")
+        
+        # ✅ Get the LOBs and types from controls (what was selected in Opportunity)
+        selected_lobs = sess["controls"].get("lobs", [])
+        selected_types = sess["controls"].get("types", ["Auto"])
+        
+        # ✅ Get offer counts per opportunity type (new format)
+        offer_counts_per_opp = req.offer_counts_per_opp or {}
+        
+        # Fallback to legacy offer_count if new format not provided
+        default_count = req.offer_count or 2
+        logger.info(f"✅ Selected LOBs: {selected_lobs}, Types: {selected_types}")
+
+        out = _offers_frame(opp_df, selected_lobs, offer_counts_per_opp, default_count)
+        sess["steps"]["offers"] = out
+        sess["status"]["offers"] = True
         
+        # Store the offer configuration for reference (and for delta recomputes)
+        sess["controls"]["offer_counts"] = offer_counts_per_opp
+        sess["controls"]["offer_default_count"] = default_count
+        
+        logger.info(f"✅ Generated {len(out)} offer rows with variable offers per opportunity type")
+        logger.info(f"✅ Offer DataFrame columns: {list(out.columns)}")
+
+    elif step == "launch":
+        if not sess["status"].get("offers"):
+            raise HTTPException(status_code=400, detail="Run Offers step first.")
+        _write_launch(sess, req.session_id)
+
+    return int(len(df))
+
+def _coerce_like(df: pd.DataFrame, like: pd.DataFrame) -> pd.DataFrame:
+    """Align df to like's columns and, where the values allow it, its dtypes"""
+    df = df.reindex(columns=like.columns)
+    for col in like.columns:
+        if df[col].dtype != like[col].dtype:
+            try:
+                df[col] = df[col].astype(like[col].dtype)
+            except (ValueError, TypeError):
+                pass
+    return df
+
+def _patch_frame(current: pd.DataFrame, touched: pd.Index, fresh: pd.DataFrame) -> pd.DataFrame:
+    """Drop the touched msisdns from a step frame and append their recomputed rows"""
+    kept = current[~current["msisdn"].astype(str).isin(touched)]
+    if fresh.empty:
+        return kept.reset_index(drop=True)
+    columns = list(current.columns) + [c for c in fresh.columns if c not in current.columns]
+    return pd.concat([kept, fresh], ignore_index=True).reindex(columns=columns)
+
+def _apply_delta(session_id: str, sess: Dict[str, Any], delta: pd.DataFrame) -> Dict[str, Any]:
+    """
+    Upsert/delete subscribers in the session's base and bring every completed step up to date.
+
+    Rows with _op == "delete" remove that msisdn; every other row replaces (or adds) it.
+    Columns a delta leaves out keep the subscriber's current values; a new subscriber
+    must carry every base column.
+    Only the touched msisdns are recomputed, unless the base is sampled or a usage
+    maximum used by _overall_usage moved, in which case all completed steps re-run.
+    """
+    raw = sess["raw"]
+    id_col = "msisdn" if "msisdn" in raw.columns else raw.columns[0]
+    if id_col not in delta.columns:
+        if "msisdn" not in delta.columns:
+            raise HTTPException(status_code=400, detail=f"Delta file must contain a '{id_col}' column")
+        delta = delta.rename(columns={"msisdn": id_col})
+
+    ops = delta["_op"].astype(str).str.strip().str.lower() if "_op" in delta.columns \
+        else pd.Series("upsert", index=delta.index)
+    keys = delta[id_col].astype(str)
+    last = ~keys.duplicated(keep="last")  # last row per msisdn wins
+    delta, ops, keys = delta[last], ops[last], keys[last]
+    is_delete = ops.isin({"delete", "del", "d"})
+
+    raw_keys = raw[id_col].astype(str)
+    upserts = delta[~is_delete].drop(columns=["_op"], errors="ignore")
+    missing = [c for c in raw.columns if c not in upserts.columns]
+    if missing and len(upserts):
+        # Partial rows update only the columns they carry; the rest come from the current row
+        up_keys = keys[~is_delete]
+        current = raw[missing].set_axis(raw_keys, axis=0)
+        current = current[~current.index.duplicated(keep="last")]
+        new_keys = up_keys[~up_keys.isin(current.index)]
+        if len(new_keys):
+            raise HTTPException(
+                status_code=400,
+                detail=f"New subscribers ({', '.join(new_keys.head(5))}{'...' if len(new_keys) > 5 else ''}) "
+                       f"must include every base column; missing: {', '.join(map(str, missing))}")
+        upserts = pd.concat([upserts, current.loc[up_keys.to_numpy()].set_axis(upserts.index, axis=0)], axis=1)
+    upserts = _coerce_like(upserts, raw)
+    touched = pd.Index(keys.unique())
+    drop_mask = raw_keys.isin(touched)
+    removed = raw[drop_mask]
+    new_raw = pd.concat([raw[~drop_mask], upserts], ignore_index=True)
+    if new_raw.empty:
+        raise HTTPException(status_code=400, detail="Delta would remove every subscriber")
+
+    completed = [s for s in ("lifecycle", "opportunity", "offers", "launch") if sess["status"].get(s)]
+    old_stats = sess.get("stats")
+    mode, reason = "incremental", ""
+    stats = old_stats
+    if not completed:
+        mode = "base_only"
+    elif len(raw) > SAMPLE_MAX_ROWS or len(new_raw) > SAMPLE_MAX_ROWS:
+        mode, reason = "full", "base is sampled"
+    elif not old_stats:
+        mode, reason = "full", "no usage statistics recorded"
+    else:
+        removed_stats = _usage_stats(_ensure_columns(removed)) if len(removed) else None
+        if removed_stats and any(removed_stats[c] >= old_stats[c] for c in USAGE_COLUMNS):
+            # A removed row held a maximum: rescan the base for the new one
+            stats = _usage_stats(_ensure_columns(new_raw))
+        elif len(upserts):
+            up_stats = _usage_stats(_ensure_columns(upserts))
+            stats = {c: max(old_stats[c], up_stats[c]) for c in USAGE_COLUMNS}
+        if stats != old_stats:
+            mode, reason = "full", "usage maxima shifted"
+
+    controls = sess["controls"]
+    sess["raw"] = new_raw
+    sess["raw_rows"], sess["raw_cols"] = int(new_raw.shape[0]), int(new_raw.shape[1])
+
+    if mode == "full":
+        logger.info(f"🔁 Delta on {session_id}: full recompute of {completed} ({reason})")
+        for step in completed:
+            _execute_step(StepRequest(
+                session_id=session_id, step=step,
+                lobs=controls.get("lobs"), opportunity_types=controls.get("types"),
+                offer_count=controls.get("offer_default_count", 2),
+                offer_counts_per_opp=controls.get("offer_counts"),
+            ), sess, step)
+    elif mode == "incremental":
+        logger.info(f"🔁 Delta on {session_id}: recomputing {len(upserts)} rows, dropping {int(is_delete.sum())}")
+        sub = _ensure_columns(upserts).reset_index(drop=True)
+        steps = sess["steps"]
+        if "lifecycle" in completed:
+            steps["lifecycle"] = _patch_frame(steps["lifecycle"], touched, _lifecycle_frame(sub, stats))
+        if "opportunity" in completed:
+            fresh_opp = _opportunity_frame(sub, controls.get("lobs", []), controls.get("types", ["Auto"]), stats)
+            steps["opportunity"] = _patch_frame(steps["opportunity"], touched, fresh_opp)
+        if "offers" in completed:
+            opp_df = steps["opportunity"]
+            fresh_offers = _offers_frame(opp_df[opp_df["msisdn"].isin(touched)], controls.get("lobs", []),
+                                         controls.get("offer_counts") or {}, controls.get("offer_default_count", 2))
+            # A full run yields offers grouped (sorted) by msisdn; keep that order
+            steps["offers"] = _patch_frame(steps["offers"], touched, fresh_offers) \
+                .sort_values(["msisdn", "lifecycle_stage"], kind="stable").reset_index(drop=True)
+        if "launch" in completed:
+            _write_launch(sess, session_id)
+
+    sess["last_delta"] = {
+        "mode": mode, "reason": reason,
+        "upserted": int(len(upserts)), "deleted": int(raw_keys.isin(keys[is_delete]).sum()),
+        "recomputed_steps": completed if mode != "base_only" else [],
+        "timestamp": _now(),
+    }
+    return sess["last_delta"]
+
+@app.post("/api/upload_delta/{session_id}")
+def upload_delta(session_id: str, file: UploadFile = File(...)):
+    """Apply a delta CSV (upserts, plus _op=delete rows) to an existing session"""
+    try:
+        logger.info(f"📤 Delta upload for session {session_id}: {file.filename}")
+        _require_session(session_id)
+        if not file.filename.endswith(".csv"):
+            raise HTTPException(status_code=400, detail="Only CSV files accepted")
+        delta = pd.read_csv(io.BytesIO(file.file.read()))
+        if delta.empty:
+            raise HTTPException(status_code=400, detail="Delta CSV is empty")
+
+        t0 = time.perf_counter()
+        with SESSIONS.lock(session_id):
+            sess = _require_session(session_id)
+            try:
+                summary = _apply_delta(session_id, sess, delta)
+                _save_session(session_id)
+            except Exception:
+                SESSIONS.invalidate(session_id)
+                raise
+        elapsed = time.perf_counter() - t0
+        DELTA_UPLOADS.inc(summary["mode"])
+
+        logger.info(f"✅ Delta applied to {session_id} ({summary['mode']}) in {elapsed:.3f}s")
+        return {"session_id": session_id, "rows": int(sess["raw_rows"]), "elapsed_s": round(elapsed, 4), **summary}
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"❌ Step error: {e}")
+        logger.error(f"❌ Delta upload error: {e}")
         logger.error(traceback.format_exc())
-        raise HTTPException(status_code=500, detail=f"Step failed: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Delta upload failed: {str(e)}")
 
 @app.get("/api/preview/{session_id}")
 def preview(session_id: str, step: str = "lifecycle", n: int = 12):
@@ -725,7 +1099,7 @@ def preview(session_id: str, step: str = "lifecycle", n: int = 12):
                 "timestamp": _now()
             }
         
-        df = df.copy().head(max(1, min(int(n), 50)))
+        df = df.head(max(1, min(int(n), 50)))
         
         # ✅ Fix NaN values - replace with empty string for JSON serialization
         df = df.fillna('')
@@ -781,6 +1155,118 @@ def download(session_id: str):
         logger.error(f"Download error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# Gross margin by line of business, and the revenue uplift / churn reduction
+# expected when a subscriber's opportunity is actioned (planning heuristics)
+LOB_MARGIN = {"DATA": 0.28, "VOICE": 0.36, "VAS": 0.45, "TOTAL_NETWORK": 0.32}
+STRATEGY_UPLIFT = {"upsell": 0.08, "crosssell": 0.05, "revive": 0.12, "retain": 0.02, "noaction": 0.0}
+STRATEGY_CHURN_CUT = {"upsell": 0.05, "crosssell": 0.03, "revive": 0.15, "retain": 0.30, "noaction": 0.0}
+
+def _lob_revenue(df: pd.DataFrame) -> Dict[str, np.ndarray]:
+    """Split each subscriber's ARPU across LOBs: VAS spend, then data/voice by usage weight"""
+    arpu = pd.to_numeric(df["arpu"], errors="coerce").fillna(10.0).clip(lower=0).to_numpy(dtype=float)
+    vas = np.minimum(pd.to_numeric(df["vas_spend_30d"], errors="coerce").fillna(0.0).clip(lower=0).to_numpy(dtype=float), arpu)
+    stats = _usage_stats(df)
+    d = pd.to_numeric(df["data_mb_30d"], errors="coerce").fillna(0.0).to_numpy(dtype=float)
+    v = pd.to_numeric(df["voice_min_30d"], errors="coerce").fillna(0.0).to_numpy(dtype=float)
+    w_d = 0.5 * d / (stats["data_mb_30d"] or 1.0)
+    w_v = 0.35 * v / (stats["voice_min_30d"] or 1.0)
+    tot = w_d + w_v
+    share_d = np.divide(w_d, tot, out=np.full_like(tot, 0.5), where=tot > 0)
+    rest = arpu - vas
+    return {"DATA": rest * share_d, "VOICE": rest * (1.0 - share_d), "VAS": vas, "TOTAL_NETWORK": arpu}
+
+def _strategies_from_lifecycle(stage: np.ndarray, churn: np.ndarray) -> np.ndarray:
+    """Vectorized _base_strategy_from_lcs, as opportunity keys"""
+    return np.select(
+        [stage == "Dropper", stage == "Stopper", stage == "Non-user", (stage == "Stable") & (churn < 0.50)],
+        ["retain", "revive", "crosssell", "upsell"],
+        default="noaction",
+    )
+
+def _strategy_weights(strategies: np.ndarray, table: Dict[str, float]) -> np.ndarray:
+    return np.select([strategies == k for k in table], list(table.values()), default=0.0).astype(float)
+
+def _build_forecast(sess: Dict[str, Any], lobs: List[str]) -> Dict[str, Any]:
+    """6-month revenue/margin/churn series and uplift KPIs from the session's base and step outputs"""
+    raw = sess["raw"]
+    df = _ensure_columns(_sample_df(raw, SAMPLE_MAX_ROWS))
+    scale = len(raw) / max(len(df), 1)  # sampled bases are scaled back to full size
+    msisdn = df["msisdn"].astype(str)
+    churn = pd.to_numeric(df["churn_risk"], errors="coerce").fillna(0.2).clip(0.0, 1.0).to_numpy(dtype=float)
+    revenue = _lob_revenue(df)
+
+    lifecycle = sess["steps"].get("lifecycle")
+    if isinstance(lifecycle, pd.DataFrame) and not lifecycle.empty:
+        by_msisdn = lifecycle.drop_duplicates("msisdn").set_index("msisdn")["lifecycle_stage"]
+        stage = msisdn.map(by_msisdn).fillna("Stable").to_numpy(dtype=object)
+    else:
+        stage = _derive_lifecycle_stage(df)["lifecycle_stage"].to_numpy(dtype=object)
+
+    # Opportunity per subscriber and LOB: from the Opportunity step if it ran, else implied by lifecycle
+    opp = sess["steps"].get("opportunity")
+    implied = _strategies_from_lifecycle(stage, churn)
+    strategy: Dict[str, np.ndarray] = {}
+    for lob in lobs:
+        if isinstance(opp, pd.DataFrame) and not opp.empty and lob in set(opp["lob"]):
+            o = opp[opp["lob"] == lob].drop_duplicates("msisdn").set_index("msisdn")["opportunity"]
+            keys = o.str.split("_").str[0]
+            strategy[lob] = msisdn.map(keys).fillna("noaction").to_numpy(dtype=object)
+        else:
+            strategy[lob] = implied
+    basis = "opportunity" if isinstance(opp, pd.DataFrame) and not opp.empty else (
+        "lifecycle" if isinstance(lifecycle, pd.DataFrame) else "base")
+
+    # TOTAL_NETWORK already contains the other LOBs; never add it on top of them
+    rev_lobs = ["TOTAL_NETWORK"] if "TOTAL_NETWORK" in lobs else lobs
+    rev = np.stack([revenue[l] for l in rev_lobs])                         # (lobs, subscribers)
+    margin_w = np.array([LOB_MARGIN[l] for l in rev_lobs])[:, None]
+    uplift = np.stack([_strategy_weights(strategy.get(l, implied), STRATEGY_UPLIFT) for l in rev_lobs])
+    churn_cut = np.stack([_strategy_weights(strategy.get(l, implied), STRATEGY_CHURN_CUT) for l in rev_lobs])
+
+    revenue_now = float(rev.sum()) * scale
+    margin_pct = float((rev * margin_w).sum() / rev.sum()) if rev.sum() > 0 else 0.0
+    rev_weight = rev.sum(axis=0)
+    monthly_churn = float(np.average(churn, weights=rev_weight) / 12.0) if rev_weight.sum() > 0 else float(churn.mean() / 12.0)
+
+    # Revenue-weighted lifecycle mix drives the trend behind the current month
+    total_w = rev_weight.sum() or 1.0
+    share = {s: float(rev_weight[stage == s].sum() / total_w) for s in ("Grower", "Dropper", "Stopper")}
+    growth = 0.03 * share["Grower"] - 0.04 * share["Dropper"] - 0.06 * share["Stopper"] - 0.2 * monthly_churn
+    churn_drift = 0.05 * (share["Dropper"] + share["Stopper"] - share["Grower"])
+
+    t = np.arange(-5, 1)
+    revenue6 = np.round(revenue_now / 1e6 * np.power(1.0 + growth, t), 3)
+    margin6 = np.round(revenue6 * margin_pct, 3)
+    churn6 = np.round(monthly_churn * 100.0 * np.power(1.0 + churn_drift, t), 2)
+
+    rev_uplift = float((rev * uplift).sum() / rev.sum() * 100.0) if rev.sum() > 0 else 0.0
+    margin_uplift = float((rev * uplift * margin_w).sum() / (rev * margin_w).sum() * 100.0) if rev.sum() > 0 else 0.0
+    churn_mass = rev * churn[None, :]
+    churn_reduction = float((churn_mass * churn_cut).sum() / churn_mass.sum() * 100.0) if churn_mass.sum() > 0 else 0.0
+
+    return {
+        "kpis": {
+            "revenue_total_m": round(float(revenue6.sum()), 3),
+            "margin_total_m": round(float(margin6.sum()), 3),
+            "churn_avg_pct": round(float(churn6.mean()), 2),
+            "rev_uplift_pct": round(rev_uplift, 1),
+            "margin_uplift_pct": round(margin_uplift, 1),
+            "churn_reduction_pct": round(churn_reduction, 1)
+        },
+        "series": {
+            "revenue6_m": revenue6.tolist(),
+            "margin6_m": margin6.tolist(),
+            "churn6_pct": churn6.tolist()
+        },
+        "basis": basis,
+    }
+
+@functools.lru_cache(maxsize=256)
+def _cached_forecast(session_id: str, lobs_key: str, version: int) -> Dict[str, Any]:
+    """Forecast memoized per (session, lobs, session version): any saved change misses the cache"""
+    FORECAST_CACHE.inc("miss")
+    return _build_forecast(_require_session(session_id), lobs_key.split(","))
+
 @app.get("/api/impact_forecast")
 def impact_forecast(session_id: str, lobs: str = ""):
     try:
@@ -798,63 +1284,20 @@ def impact_forecast(session_id: str, lobs: str = ""):
                 yy -= 1
             months.append(calendar.month_abbr[mm])
 
-        lobs_key = (lobs or "").strip()
-        seed_key = f"{session_id}|{lobs_key}"
-        seed_int = int(hashlib.md5(seed_key.encode("utf-8")).hexdigest()[:8], 16)
-        rng = np.random.default_rng(seed_int)
-
-        base_size = int(sess.get("raw_rows") or 50000)
-        size_factor = np.clip(base_size / 100000.0, 0.35, 2.50)
-
-        rev_start = (80 + 70 * rng.random()) * size_factor
-        rev_trend = (1.5 + 3.5 * rng.random())
-        revenue6 = []
-        val = rev_start
-        for _ in range(6):
-            val = val + rev_trend + rng.normal(0, 2.2)
-            revenue6.append(float(np.clip(val, 10, None)))
-        revenue6 = [round(x, 1) for x in revenue6]
-
-        margin_pct_base = 0.22 + 0.10 * rng.random()
-        margin6 = []
-        for r in revenue6:
-            mp = margin_pct_base + rng.normal(0, 0.008)
-            margin6.append(round(max(0.0, r * mp), 1))
-
-        churn_start = 2.6 + 1.6 * rng.random()
-        churn_drop = 0.06 + 0.10 * rng.random()
-        churn6 = []
-        cv = churn_start
-        for _ in range(6):
-            cv = cv - churn_drop + rng.normal(0, 0.03)
-            churn6.append(float(np.clip(cv, 0.6, 9.0)))
-        churn6 = [round(x, 2) for x in churn6]
-
-        revenue_total = round(sum(revenue6), 1)
-        margin_total = round(sum(margin6), 1)
-        churn_avg = round(float(np.mean(churn6)), 2)
-
-        s = _hash01(seed_key, "uplift")
-        rev_uplift = round(1.5 + 6.0 * s, 1)
-        margin_uplift = round(0.8 + 4.0 * s, 1)
-        churn_reduction = round(0.6 + 3.5 * s, 1)
+        requested = [x for x in (lobs or "").split(",") if x.strip()]
+        lob_list = _normalize_lobs(requested or sess.get("controls", {}).get("lobs"))
+        lobs_key = ",".join(lob_list)
+
+        misses = _cached_forecast.cache_info().misses
+        forecast = _cached_forecast(session_id, lobs_key, SESSIONS.version(session_id) or 0)
+        if _cached_forecast.cache_info().misses == misses:
+            FORECAST_CACHE.inc("hit")
 
         return {
             "session_id": session_id,
-            "kpis": {
-                "revenue_total_m": revenue_total,
-                "margin_total_m": margin_total,
-                "churn_avg_pct": churn_avg,
-                "rev_uplift_pct": rev_uplift,
-                "margin_uplift_pct": margin_uplift,
-                "churn_reduction_pct": churn_reduction
-            },
-            "series": {
-                "months6": months,
-                "revenue6_m": revenue6,
-                "margin6_m": margin6,
-                "churn6_pct": churn6
-            },
+            "kpis": forecast["kpis"],
+            "series": {"months6": months, **forecast["series"]},
+            "basis": forecast["basis"],
             "timestamp": _now()
         }
     except HTTPException:
@@ -863,18 +1306,44 @@ def impact_forecast(session_id: str, lobs: str = ""):
         logger.error(f"Forecast error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+def _publish_endpoint(target: str, requested: Optional[str]) -> str:
+    """Server-configured endpoint for a target; a client-supplied URL must be allowlisted"""
+    # Per-target default endpoint, e.g. NIYAX_PUBLISH_URL_NEON_DX; none means a dry run
+    configured = os.environ.get(f"NIYAX_PUBLISH_URL_{target.upper()}", "").strip()
+    requested = (requested or "").strip()
+    if not requested:
+        return configured
+    # The launch frame is subscriber data: never POST it to a host the operator did not approve
+    allowed = {u.strip().rstrip("/") for u in os.environ.get("NIYAX_PUBLISH_ALLOWED_URLS", "").split(",") if u.strip()}
+    if configured:
+        allowed.add(configured.rstrip("/"))
+    if requested.rstrip("/") not in allowed:
+        raise HTTPException(status_code=400, detail="endpoint_url is not an allowed publish target.")
+    return requested
+
 @app.post("/api/publish")
-def publish(req: PublishRequest):
+async def publish(req: PublishRequest):
     try:
-        _ = _require_session(req.session_id)
+        # SQLite read, plus an Arrow load when this worker has not cached the session
+        sess = await asyncio.to_thread(_require_session, req.session_id)
+        if not sess.get("status", {}).get("launch"):
+            raise HTTPException(status_code=400, detail="Run Review & Launch first (Launch action).")
         ref = f"PUB-{req.session_id}-{int(_hash01(req.session_id, req.target)*100000):05d}"
+        endpoint = _publish_endpoint(req.target, req.endpoint_url)
+
+        def load_launch() -> pd.DataFrame:
+            return _require_session(req.session_id)["steps"]["launch"]
+
+        job = await PUBLISHER.start(ref, req.session_id, req.target, endpoint, load_launch, resume=req.resume)
+        logger.info(f"📡 Publish {ref}: {job['status']}")
         return {
             "ok": True,
-            "status": "queued",
+            "status": job["status"],
             "reference_id": ref,
             "target": req.target,
             "mode": req.mode,
-            "endpoint_url": req.endpoint_url or "",
+            "endpoint_url": endpoint,
+            "progress": job,
             "timestamp": _now()
         }
     except HTTPException:
@@ -883,6 +1352,132 @@ def publish(req: PublishRequest):
         logger.error(f"Publish error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/publish/{reference_id}")
+def publish_status(reference_id: str):
+    job = PUBLISHER.status(reference_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Publish job not found.")
+    return dict(job, timestamp=_now())
+
+# -------------------------
+# Orchestration: agent stages as a DAG, streamed over SSE
+# -------------------------
+# stage -> stages it needs; stages whose dependencies are met run concurrently
+ORCHESTRATION_DAG = {
+    "lifecycle": [],
+    "opportunity": ["lifecycle"],
+    "offers": ["opportunity"],
+    "forecast": ["opportunity"],
+}
+# Added when the session was already launched, so the launch file never lags the new offers
+LAUNCH_STAGE = {"launch": ["offers"]}
+ORCHESTRATION_HEARTBEAT_S = 0.5
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+def _stage_summary(stage: str, df: pd.DataFrame) -> Dict[str, Any]:
+    """Small, chat-sized digest of a step output"""
+    if stage == "lifecycle":
+        counts = df["lifecycle_stage"].value_counts()
+        return {"subscribers": int(len(df)), "stages": {str(k): int(v) for k, v in counts.items()}}
+    if stage == "opportunity":
+        counts = df.groupby(["lob", "opportunity"]).size().sort_values(ascending=False).head(8)
+        return {"rows": int(len(df)),
+                "opportunities": [{"lob": lob, "opportunity": opp, "subscribers": int(n)}
+                                  for (lob, opp), n in counts.items()]}
+    if stage == "launch":
+        return {"subscribers": int(len(df))}
+    first = [c for c in df.columns if c.endswith("_offer1")]
+    top = pd.concat([df[c] for c in first]).value_counts().head(5) if first else pd.Series(dtype=int)
+    return {"subscribers": int(len(df)),
+            "top_offers": [{"offer": str(k), "subscribers": int(v)} for k, v in top.items()]}
+
+def _run_orchestration_stage(session_id: str, stage: str, controls: Dict[str, Any]) -> Dict[str, Any]:
+    if stage == "forecast":
+        forecast = impact_forecast(session_id, ",".join(controls["lobs"]))
+        return {"kpis": forecast["kpis"], "series": forecast["series"], "basis": forecast["basis"]}
+    req = StepRequest(session_id=session_id, step=stage, lobs=controls["lobs"],
+                      opportunity_types=controls["types"], offer_count=controls["offer_default_count"],
+                      offer_counts_per_opp=controls["offer_counts"])
+    # No artificial pause: the stream itself shows progress
+    result = _run_step_coalesced(req, stage, delay_s=0.0)
+    df = _require_session(session_id)["steps"][stage]
+    return {"elapsed_s": result["elapsed_s"], "rows": result["rows"],
+            "coalesced": result.get("coalesced", False), "summary": _stage_summary(stage, df)}
+
+async def _orchestration_events(session_id: str, dag: Dict[str, List[str]], controls: Dict[str, Any]):
+    queue: asyncio.Queue = asyncio.Queue()
+    tasks: Dict[str, asyncio.Task] = {}
+    t_start = time.perf_counter()
+
+    async def run_stage(stage: str):
+        try:
+            for dep in dag[stage]:
+                await tasks[dep]
+        except Exception:
+            await queue.put(_sse("stage", {"stage": stage, "status": "skipped"}))
+            raise
+        await queue.put(_sse("stage", {"stage": stage, "status": "running", "after": dag[stage]}))
+        t0 = time.perf_counter()
+        work = asyncio.ensure_future(asyncio.to_thread(
+            _run_orchestration_stage, session_id, stage, controls))
+        while not work.done():
+            await asyncio.wait({work}, timeout=ORCHESTRATION_HEARTBEAT_S)
+            if not work.done():
+                await queue.put(_sse("progress", {"stage": stage, "elapsed_s": round(time.perf_counter() - t0, 2)}))
+        try:
+            out = work.result()
+        except Exception as e:
+            detail = e.detail if isinstance(e, HTTPException) else str(e)
+            logger.error(f"❌ Orchestration stage {stage} failed for session {session_id}: {detail}")
+            await queue.put(_sse("stage", {"stage": stage, "status": "failed", "error": detail}))
+            raise
+        await queue.put(_sse("stage", {"stage": stage, "status": "completed",
+                                       "wall_s": round(time.perf_counter() - t0, 3), **out}))
+
+    async def finish():
+        results = await asyncio.gather(*tasks.values(), return_exceptions=True)
+        failed = [s for s, r in zip(tasks, results) if isinstance(r, BaseException)]
+        await queue.put(_sse("done", {"ok": not failed, "failed": failed,
+                                      "wall_s": round(time.perf_counter() - t_start, 3), "timestamp": _now()}))
+        await queue.put(None)
+
+    for stage in dag:
+        tasks[stage] = asyncio.create_task(run_stage(stage))
+    finisher = asyncio.create_task(finish())
+    try:
+        yield _sse("plan", {"session_id": session_id, "stages": dag, "lobs": controls["lobs"]})
+        while True:
+            item = await queue.get()
+            if item is None:
+                break
+            yield item
+    finally:
+        # Client went away: stop waiting (a step already running in a thread still completes and saves)
+        for t in [*tasks.values(), finisher]:
+            t.cancel()
+
+@app.get("/api/orchestrate/{session_id}")
+async def orchestrate(session_id: str, lobs: Optional[str] = None, types: Optional[str] = None,
+                      offer_count: Optional[int] = None):
+    sess = await asyncio.to_thread(_require_session, session_id)
+    # Anything not given explicitly keeps what the analyst chose in the workspace
+    saved = sess.get("controls", {})
+    requested_lobs = [x for x in (lobs or "").split(",") if x.strip()]
+    requested_types = [x.strip() for x in (types or "").split(",") if x.strip()]
+    controls = {
+        "lobs": _normalize_lobs(requested_lobs or saved.get("lobs")),
+        "types": requested_types or saved.get("types") or ["Auto"],
+        "offer_default_count": offer_count or saved.get("offer_default_count") or 2,
+        "offer_counts": saved.get("offer_counts") or {},
+    }
+    dag = dict(ORCHESTRATION_DAG, **LAUNCH_STAGE) if sess.get("status", {}).get("launch") else ORCHESTRATION_DAG
+    logger.info(f"🧭 Orchestrating {list(dag)} for session {session_id} with {controls}")
+    return StreamingResponse(_orchestration_events(session_id, dag, controls),
+                             media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 # Startup event
 @app.on_event("startup")
 async def startup_event():
@@ -896,9 +1491,16 @@ async def startup_event():
     logger.info(f"✅ Landing page: {(STATIC_DIR / 'landing.html').exists()}")
     logger.info(f"✅ Demo page: {(STATIC_DIR / 'index.html').exists()}")
     logger.info("=" * 60)
-    _load_sessions()
-    logger.info(f"📊 Active sessions: {len(SESSIONS)}")
-    logger.info("=" * 60)
+    # Every uvicorn worker has its own registry; merge them so any worker can answer a scrape
+    metrics.enable_multiprocess(DATA_DIR / "metrics")
+    # Recovery only tidies files no session references, so it does not have to
+    # finish before the worker serves; run it once, off the event loop
+    app.state.recovery = asyncio.get_running_loop().run_in_executor(None, _load_sessions)
+    app.state.sweeper = asyncio.create_task(_sweep_sessions_periodically())
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    app.state.sweeper.cancel()
+    # Running publish jobs keep their checkpoint and resume on the next publish call
+    await PUBLISHER.aclose()
 
-# Initialize on import
-_load_sessions()
@@ -0,0 +1,351 @@
+"""
+Minimal in-process metrics with Prometheus text exposition.
+
+Counters, gauges and histograms keyed by label values, rendered by
+``render()`` in the Prometheus text format (version 0.0.4) for ``/metrics``.
+
+With several uvicorn workers each process has its own registry, and a scrape
+lands on any one of them. ``enable_multiprocess(directory)`` makes every
+worker write a snapshot of its registry to ``directory`` (about once a
+second, and on each scrape it serves), and ``render()`` then merges all
+snapshots of the current server generation:
+
+* counters and histograms are summed over every worker that ever ran, so a
+  worker restart never shows up as a counter reset;
+* gauges follow their ``multiprocess_mode``: ``"all"`` (one series per live
+  worker, with a ``pid`` label), ``"livesum"`` or ``"max"`` over live workers,
+  or ``"local"`` for values a collector reads from shared state on every
+  scrape (the scraping worker's own value).
+"""
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+from contextlib import contextmanager
+from pathlib import Path
+import json
+import os
+import re
+import resource
+import shutil
+import sys
+import threading
+import time
+
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_REGISTRY: List["_Metric"] = []
+_COLLECTORS: List[Callable[[], None]] = []
+_LOCK = threading.Lock()
+
+# Multiprocess mode: snapshot directory of this server generation, and whether
+# this worker changed anything since its last snapshot
+_SHARED: Dict[str, Any] = {"dir": None, "dirty": False}
+
+# (pid, alive, exported samples of one metric) for every worker snapshot
+_Parts = List[Tuple[int, bool, list]]
+
+
+def _escape(v: str) -> str:
+    return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt_labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{_escape(extra[1])}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _fmt_value(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if not float(v).is_integer() else str(int(v))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, doc: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.doc = doc
+        self.labels = tuple(labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        with _LOCK:
+            _REGISTRY.append(self)
+
+    def _key(self, labels: Sequence[str]) -> Tuple[str, ...]:
+        if len(labels) != len(self.labels):
+            raise ValueError(f"{self.name} expects labels {self.labels}")
+        return tuple(str(v) for v in labels)
+
+    def _export(self) -> list:
+        return [[list(k), v] for k, v in self._values.items()]
+
+    def _merge(self, parts: _Parts) -> Tuple[Tuple[str, ...], Dict[Tuple[str, ...], Any]]:
+        merged: Dict[Tuple[str, ...], float] = {}
+        for _pid, _alive, rows in parts:
+            for k, v in rows:
+                merged[tuple(k)] = merged.get(tuple(k), 0.0) + v
+        return self.labels, merged
+
+    def _samples(self, names: Sequence[str], values: Dict[Tuple[str, ...], Any]) -> List[str]:
+        return [f"{self.name}{_fmt_labels(names, k)} {_fmt_value(v)}" for k, v in values.items()]
+
+    def render(self, parts: Optional[_Parts] = None) -> str:
+        with _LOCK:
+            names, values = (self.labels, self._values) if parts is None else self._merge(parts)
+            lines = [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} {self.kind}"] + self._samples(names, values)
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        k = self._key(labels)
+        with _LOCK:
+            self._values[k] = self._values.get(k, 0.0) + amount
+            _SHARED["dirty"] = True
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+    MODES = ("all", "livesum", "max", "local")
+
+    def __init__(self, name: str, doc: str, labels: Sequence[str] = (), multiprocess_mode: str = "all"):
+        if multiprocess_mode not in self.MODES:
+            raise ValueError(f"multiprocess_mode must be one of {self.MODES}")
+        super().__init__(name, doc, labels)
+        self.multiprocess_mode = multiprocess_mode
+
+    def set(self, *labels: str, value: float) -> None:
+        k = self._key(labels)
+        with _LOCK:
+            self._values[k] = float(value)
+            _SHARED["dirty"] = True
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        k = self._key(labels)
+        with _LOCK:
+            self._values[k] = self._values.get(k, 0.0) + amount
+            _SHARED["dirty"] = True
+
+    def dec(self, *labels: str, amount: float = 1.0) -> None:
+        self.inc(*labels, amount=-amount)
+
+    def _merge(self, parts: _Parts) -> Tuple[Tuple[str, ...], Dict[Tuple[str, ...], Any]]:
+        if self.multiprocess_mode == "local":
+            parts = [p for p in parts if p[0] == os.getpid()]
+        live = [(pid, rows) for pid, alive, rows in parts if alive]
+        merged: Dict[Tuple[str, ...], float] = {}
+        if self.multiprocess_mode == "all":
+            for pid, rows in live:
+                for k, v in rows:
+                    merged[tuple(k) + (str(pid),)] = v
+            return self.labels + ("pid",), merged
+        for _pid, rows in live:
+            for k, v in rows:
+                k = tuple(k)
+                if self.multiprocess_mode == "livesum":
+                    merged[k] = merged.get(k, 0.0) + v
+                else:
+                    merged[k] = max(merged.get(k, v), v)
+        return self.labels, merged
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, doc: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, doc, labels)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, *labels: str, value: float) -> None:
+        k = self._key(labels)
+        with _LOCK:
+            s = self._series.get(k)
+            if s is None:
+                # [bucket counts..., sum, count]
+                s = self._series[k] = [0.0] * (len(self.buckets) + 2)
+            for i, b in enumerate(self.buckets):
+                if value <= b:
+                    s[i] += 1
+            s[-2] += value
+            s[-1] += 1
+            _SHARED["dirty"] = True
+
+    def _export(self) -> list:
+        return [[list(k), s] for k, s in self._series.items()]
+
+    def _merge(self, parts: _Parts) -> Tuple[Tuple[str, ...], Dict[Tuple[str, ...], Any]]:
+        merged: Dict[Tuple[str, ...], List[float]] = {}
+        for _pid, _alive, rows in parts:
+            for k, s in rows:
+                if len(s) != len(self.buckets) + 2:
+                    continue  # written with other buckets
+                acc = merged.setdefault(tuple(k), [0.0] * len(s))
+                for i, v in enumerate(s):
+                    acc[i] += v
+        return self.labels, merged
+
+    def render(self, parts: Optional[_Parts] = None) -> str:
+        if parts is None:
+            with _LOCK:
+                series = {k: list(s) for k, s in self._series.items()}
+            parts = [(os.getpid(), True, [[list(k), s] for k, s in series.items()])]
+        return super().render(parts)
+
+    def _samples(self, names: Sequence[str], values: Dict[Tuple[str, ...], Any]) -> List[str]:
+        out = []
+        for k, s in values.items():
+            for i, b in enumerate(self.buckets):
+                out.append(f"{self.name}_bucket{_fmt_labels(names, k, ('le', _fmt_value(b)))} {_fmt_value(s[i])}")
+            out.append(f"{self.name}_sum{_fmt_labels(names, k)} {_fmt_value(s[-2])}")
+            out.append(f"{self.name}_count{_fmt_labels(names, k)} {_fmt_value(s[-1])}")
+        return out
+
+
+def register_collector(fn: Callable[[], None]) -> None:
+    """Register a callback run before each scrape to refresh computed gauges."""
+    _COLLECTORS.append(fn)
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def enable_multiprocess(directory: Path, flush_every_s: float = 1.0) -> None:
+    """Aggregate metrics across worker processes through snapshot files under directory."""
+    if _SHARED["dir"] is not None:
+        return
+    root = Path(directory)
+    # Workers of one server share their parent; a new server starts a new generation
+    _SHARED["dir"] = root / str(os.getppid())
+    _SHARED["dirty"] = True
+    if root.exists():
+        for gen in root.iterdir():
+            if gen.is_dir() and gen.name.isdigit() and not _pid_alive(int(gen.name)):
+                shutil.rmtree(gen, ignore_errors=True)
+
+    def flush_loop():
+        while True:
+            time.sleep(flush_every_s)
+            if _SHARED["dirty"]:
+                try:
+                    _flush()
+                except Exception:
+                    pass
+
+    threading.Thread(target=flush_loop, name="metrics-flush", daemon=True).start()
+
+
+def _flush() -> None:
+    """Write this worker's snapshot (atomically) into the shared directory."""
+    with _LOCK:
+        _SHARED["dirty"] = False
+        snapshot = {m.name: m._export() for m in _REGISTRY}
+    out = _SHARED["dir"] / f"{os.getpid()}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    tmp = out.with_suffix(".json.tmp")
+    tmp.write_text(json.dumps(snapshot), encoding="utf-8")
+    os.replace(tmp, out)
+
+
+def _read_snapshots() -> List[Tuple[int, bool, Dict[str, list]]]:
+    snapshots = []
+    for f in _SHARED["dir"].glob("*.json"):
+        try:
+            pid = int(f.stem)
+            data = json.loads(f.read_text(encoding="utf-8"))
+        except (ValueError, OSError):
+            continue  # being replaced, or not ours
+        snapshots.append((pid, pid == os.getpid() or _pid_alive(pid), data))
+    return snapshots
+
+
+def render() -> str:
+    for fn in list(_COLLECTORS):
+        try:
+            fn()
+        except Exception:
+            pass
+    if _SHARED["dir"] is None:
+        return "\n".join(m.render() for m in list(_REGISTRY)) + "\n"
+    _flush()
+    snapshots = _read_snapshots()
+    return "\n".join(m.render([(pid, alive, data.get(m.name, [])) for pid, alive, data in snapshots])
+                     for m in list(_REGISTRY)) + "\n"
+
+
+def peak_rss_bytes() -> int:
+    """Process peak resident set size (high-water mark) in bytes."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS reports bytes
+    return int(peak) if sys.platform == "darwin" else int(peak) * 1024
+
+
+def rss_bytes() -> int:
+    """Current resident set size in bytes (falls back to the peak off Linux)."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except Exception:
+        return peak_rss_bytes()
+
+
+# Peak-RSS windows open in this process, and whether the first one reset the mark
+_PEAK_WINDOWS = {"open": 0, "reset": False}
+_PEAK_LOCK = threading.Lock()
+
+
+def _reset_peak_rss() -> bool:
+    """Reset the kernel's RSS high-water mark for this process (Linux >= 4.0)."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _vm_hwm_bytes() -> Optional[int]:
+    try:
+        with open("/proc/self/status", "r") as f:
+            return int(re.search(r"VmHWM:\s+(\d+)", f.read()).group(1)) * 1024
+    except (OSError, AttributeError):
+        return None
+
+
+@contextmanager
+def peak_rss_window() -> Iterator[Dict[str, Any]]:
+    """Measure how far the process RSS peaks above its level at entry while the block runs.
+
+    Yields a dict whose "bytes" (and "method") are filled in on exit. On Linux
+    the high-water mark is reset when the first window opens ("vm_hwm"); a
+    window that opens while others run shares their mark, so overlapping
+    windows can include each other's memory. Elsewhere the growth of the
+    lifetime peak is used ("ru_maxrss"), which reads ~0 once the process has
+    been bigger before. Either way memory the process freed but still holds
+    is reused without raising RSS, so a warm process reads lower than a cold one.
+    """
+    with _PEAK_LOCK:
+        if _PEAK_WINDOWS["open"] == 0:
+            _PEAK_WINDOWS["reset"] = _reset_peak_rss() and _vm_hwm_bytes() is not None
+        _PEAK_WINDOWS["open"] += 1
+        reset = _PEAK_WINDOWS["reset"]
+        start = rss_bytes() if reset else peak_rss_bytes()
+    out: Dict[str, Any] = {"bytes": 0, "method": "vm_hwm" if reset else "ru_maxrss"}
+    try:
+        yield out
+    finally:
+        peak = (_vm_hwm_bytes() or start) if reset else peak_rss_bytes()
+        out["bytes"] = max(0, peak - start)
+        with _PEAK_LOCK:
+            _PEAK_WINDOWS["open"] -= 1
@@ -0,0 +1,290 @@
+"""
+Batched publish pipeline for launch outputs.
+
+A publish job streams the launch DataFrame to the target endpoint as JSON
+batches over one pooled keep-alive HTTP client per worker. A producer
+serializes batches into a bounded queue (backpressure: it stops when the
+senders fall behind) and ``concurrency`` sender tasks POST them, retrying
+connection errors, 429 and 5xx with exponential backoff and jitter.
+
+Job progress and a checkpoint (the watermark below which every batch is
+acknowledged) live in SQLite next to the session index, so progress is
+queryable from any worker and an interrupted job resumes from its
+checkpoint. ``rows_sent`` only counts rows below the watermark, so batches
+acknowledged out of order and resent after a resume are never counted
+twice. Every batch carries an ``Idempotency-Key`` made of the job, its
+run id and the batch number: batches resent after a resume keep their run id
+and can be de-duplicated by the target, while a fresh publish of the same
+session (e.g. after a delta upload) gets a new run id and is not mistaken
+for a resend. SQLite calls made from the event loop run in a thread, since
+the database is shared with the session store's writers.
+
+Without an endpoint URL the job runs dry: batches are serialized and
+counted but nothing is sent.
+"""
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Any, Callable, Dict, Optional
+from pathlib import Path
+import asyncio
+import functools
+import json
+import logging
+import math
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS publish_jobs (
+    reference_id TEXT PRIMARY KEY,
+    session_id TEXT NOT NULL,
+    target TEXT NOT NULL,
+    endpoint_url TEXT NOT NULL,
+    run_id TEXT NOT NULL DEFAULT '',
+    status TEXT NOT NULL,
+    batch_size INTEGER NOT NULL,
+    total_rows INTEGER NOT NULL DEFAULT 0,
+    total_batches INTEGER NOT NULL DEFAULT 0,
+    watermark INTEGER NOT NULL DEFAULT 0,
+    rows_sent INTEGER NOT NULL DEFAULT 0,
+    resumed_rows INTEGER NOT NULL DEFAULT 0,
+    retries INTEGER NOT NULL DEFAULT 0,
+    error TEXT NOT NULL DEFAULT '',
+    owner_pid INTEGER NOT NULL DEFAULT 0,
+    started_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    finished_at REAL
+)
+"""
+
+RETRYABLE_STATUS = {408, 425, 429, 500, 502, 503, 504}
+
+# Columns added after the first release, created on old databases
+_ADDED_COLUMNS = {
+    "run_id": "TEXT NOT NULL DEFAULT ''",
+    "resumed_rows": "INTEGER NOT NULL DEFAULT 0",
+}
+
+# A "running" job whose owner has not checkpointed for this long is treated as dead
+STALE_AFTER_S = 60.0
+CHECKPOINT_EVERY_S = 0.5
+
+
+class PublishError(Exception):
+    pass
+
+
+class PublishEngine:
+    def __init__(self, db_path: Path, batch_size: int = 5000, concurrency: int = 4,
+                 max_retries: int = 5, timeout_s: float = 30.0, backoff_s: float = 0.5):
+        self.db_path = Path(db_path)
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.timeout_s = timeout_s
+        self.backoff_s = backoff_s
+        self._client = None
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+
+    # -- storage ----------------------------------------------------------
+    def _execute(self, sql: str, params: tuple = ()) -> Optional[sqlite3.Row]:
+        """Run one statement on the shared connection (used from the loop and from threadpool endpoints)."""
+        with self._db_lock:
+            if self._db is None:
+                self.db_path.parent.mkdir(parents=True, exist_ok=True)
+                self._db = sqlite3.connect(str(self.db_path), timeout=30.0, isolation_level=None,
+                                           check_same_thread=False)
+                self._db.row_factory = sqlite3.Row
+                self._db.execute("PRAGMA journal_mode=WAL")
+                self._db.execute(_SCHEMA)
+                cols = {r[1] for r in self._db.execute("PRAGMA table_info(publish_jobs)")}
+                for col, decl in _ADDED_COLUMNS.items():
+                    if col not in cols:
+                        self._db.execute(f"ALTER TABLE publish_jobs ADD COLUMN {col} {decl}")
+            return self._db.execute(sql, params).fetchone()
+
+    def _update(self, ref: str, **fields):
+        fields["updated_at"] = time.time()
+        cols = ", ".join(f"{k} = ?" for k in fields)
+        self._execute(f"UPDATE publish_jobs SET {cols} WHERE reference_id = ?", (*fields.values(), ref))
+
+    def status(self, ref: str) -> Optional[Dict[str, Any]]:
+        row = self._execute("SELECT * FROM publish_jobs WHERE reference_id = ?", (ref,))
+        if row is None:
+            return None
+        job = dict(row)
+        end = job["finished_at"] or job["updated_at"]
+        elapsed = max(end - job["started_at"], 1e-9)
+        # Rows sent by this run; a resumed run started with resumed_rows already sent
+        job["rows_per_s"] = round(max(job["rows_sent"] - job["resumed_rows"], 0) / elapsed, 1)
+        job["progress_pct"] = round(100.0 * job["watermark"] / job["total_batches"], 1) if job["total_batches"] else 0.0
+        job["dry_run"] = not job["endpoint_url"]
+        if job["status"] == "running" and time.time() - job["updated_at"] > STALE_AFTER_S:
+            job["status"] = "stalled"
+        return job
+
+    # -- lifecycle --------------------------------------------------------
+    async def _http(self):
+        if self._client is None:
+            import httpx
+            limits = httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency)
+            self._client = httpx.AsyncClient(timeout=self.timeout_s, limits=limits,
+                                             headers={"Content-Type": "application/json"})
+        return self._client
+
+    async def start(self, ref: str, session_id: str, target: str, endpoint_url: str,
+                    load_frame: Callable[[], pd.DataFrame], resume: bool = True) -> Dict[str, Any]:
+        """Start (or resume) a job; returns its status. A job already running is left alone."""
+        task = self._tasks.get(ref)
+        if task is not None and not task.done():
+            return await asyncio.to_thread(self.status, ref)
+
+        job = await asyncio.to_thread(self.status, ref)
+        if job and job["status"] == "running":
+            # Owned by another worker that is still checkpointing
+            return job
+
+        # A fresh run gets a fresh run id; only a resumed run keeps its batch keys
+        watermark, rows_sent, run_id = 0, 0, uuid.uuid4().hex[:12]
+        if (resume and job and job["status"] in {"failed", "interrupted", "stalled"}
+                and job["batch_size"] == self.batch_size and job["endpoint_url"] == endpoint_url
+                and job["run_id"]):
+            watermark, run_id = job["watermark"], job["run_id"]
+            # Rows of the batches below the checkpoint; anything above it is resent
+            rows_sent = min(watermark * self.batch_size, job["total_rows"])
+            logger.info(f"📡 Resuming publish {ref} from batch {watermark}/{job['total_batches']}")
+
+        now = time.time()
+        await asyncio.to_thread(
+            self._execute,
+            "INSERT OR REPLACE INTO publish_jobs (reference_id, session_id, target, endpoint_url, run_id, status, "
+            "batch_size, total_rows, total_batches, watermark, rows_sent, resumed_rows, retries, error, owner_pid, "
+            "started_at, updated_at, finished_at) VALUES (?, ?, ?, ?, ?, 'running', ?, ?, ?, ?, ?, ?, 0, '', ?, ?, ?, NULL)",
+            (ref, session_id, target, endpoint_url, run_id, self.batch_size,
+             job["total_rows"] if watermark else 0, job["total_batches"] if watermark else 0,
+             watermark, rows_sent, rows_sent, os.getpid(), now, now))
+
+        self._tasks[ref] = asyncio.create_task(
+            self._run(ref, run_id, target, endpoint_url, load_frame, watermark, rows_sent))
+        return await asyncio.to_thread(self.status, ref)
+
+    async def aclose(self):
+        """Stop running jobs (checkpoint kept, status 'interrupted') and close the pool."""
+        for ref, task in list(self._tasks.items()):
+            if not task.done():
+                task.cancel()
+                try:
+                    await task
+                except (asyncio.CancelledError, Exception):
+                    pass
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    # -- the job ----------------------------------------------------------
+    async def _run(self, ref: str, run_id: str, target: str, endpoint_url: str,
+                   load_frame: Callable[[], pd.DataFrame], watermark: int, rows_sent: int):
+        update = functools.partial(asyncio.to_thread, self._update, ref)
+        try:
+            df = await asyncio.to_thread(load_frame)
+            total_rows = int(len(df))
+            total_batches = math.ceil(total_rows / self.batch_size)
+            await update(total_rows=total_rows, total_batches=total_batches)
+            logger.info(f"📡 Publishing {ref}: {total_rows} rows in {total_batches} batches -> "
+                        f"{endpoint_url or 'dry run'}")
+
+            queue: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency * 2)
+            done = set()
+            state = {"watermark": watermark, "rows_sent": rows_sent, "retries": 0, "saved": time.monotonic()}
+
+            def serialize(i: int) -> bytes:
+                chunk = df.iloc[i * self.batch_size:(i + 1) * self.batch_size]
+                header = json.dumps({"reference_id": ref, "target": target, "batch": i,
+                                     "total_batches": total_batches, "rows": int(len(chunk))})
+                return (header[:-1] + ', "records": ' + chunk.to_json(orient="records") + "}").encode("utf-8")
+
+            async def produce():
+                for i in range(watermark, total_batches):
+                    body = await asyncio.to_thread(serialize, i)
+                    await queue.put((i, body))  # blocks while senders are behind
+                for _ in range(self.concurrency):
+                    await queue.put(None)
+
+            async def checkpoint(force: bool = False):
+                if force or time.monotonic() - state["saved"] >= CHECKPOINT_EVERY_S:
+                    state["saved"] = time.monotonic()
+                    await update(watermark=state["watermark"], rows_sent=state["rows_sent"],
+                                 retries=state["retries"])
+
+            async def send():
+                while True:
+                    item = await queue.get()
+                    if item is None:
+                        return
+                    i, body = item
+                    if endpoint_url:
+                        await self._post(f"{ref}-{run_id}-{i}", endpoint_url, i, body, state)
+                    done.add(i)
+                    while state["watermark"] in done:
+                        done.discard(state["watermark"])
+                        state["watermark"] += 1
+                    state["rows_sent"] = min(state["watermark"] * self.batch_size, total_rows)
+                    await checkpoint()
+
+            workers = [asyncio.create_task(send()) for _ in range(self.concurrency)]
+            producer = asyncio.create_task(produce())
+            try:
+                await asyncio.gather(producer, *workers)
+            except BaseException:
+                for t in [producer, *workers]:
+                    t.cancel()
+                await checkpoint(force=True)
+                raise
+
+            await checkpoint(force=True)
+            await update(status="completed", finished_at=time.time())
+            logger.info(f"✅ Publish {ref} completed: {state['rows_sent']} rows")
+        except asyncio.CancelledError:
+            await update(status="interrupted")
+            raise
+        except Exception as e:
+            logger.error(f"❌ Publish {ref} failed: {e}")
+            await update(status="failed", error=str(e)[:500], finished_at=time.time())
+        finally:
+            self._tasks.pop(ref, None)
+
+    async def _post(self, key: str, url: str, batch: int, body: bytes, state: Dict[str, Any]):
+        client = await self._http()
+        headers = {"Idempotency-Key": key}
+        for attempt in range(self.max_retries + 1):
+            retry_after = None
+            try:
+                r = await client.post(url, content=body, headers=headers)
+                if r.status_code < 300:
+                    return
+                if r.status_code not in RETRYABLE_STATUS:
+                    raise PublishError(f"batch {batch}: HTTP {r.status_code} {r.text[:200]}")
+                retry_after = r.headers.get("Retry-After")
+                reason = f"HTTP {r.status_code}"
+            except PublishError:
+                raise
+            except Exception as e:  # connection reset, timeout, ...
+                reason = repr(e)
+            if attempt == self.max_retries:
+                raise PublishError(f"batch {batch}: gave up after {attempt + 1} attempts ({reason})")
+            state["retries"] += 1
+            delay = self.backoff_s * (2 ** attempt) * (0.5 + random.random())
+            if retry_after and retry_after.isdigit():
+                delay = max(delay, float(retry_after))
+            await asyncio.sleep(min(delay, 30.0))
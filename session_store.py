@@ -0,0 +1,354 @@
+"""
+Shared session store for multi-worker deployments.
+
+Session metadata (status, controls, output path, ...) lives in a SQLite
+index (WAL mode, safe for concurrent readers/writers across processes);
+DataFrames are written once as uncompressed Arrow IPC (Feather v2) files and
+read back memory-mapped. Every save bumps a per-session version, so a worker
+only re-reads a session when another worker changed it, and then only the
+frames whose files changed.
+
+The store behaves like the old ``Dict[str, Dict[str, Any]]``: ``sid in store``,
+``store[sid]`` and ``store[sid] = sess``. Mutating a session returned by
+``store[sid]`` is local to this worker until ``store.save(sid)``.
+``store.lock(sid)`` serializes read-modify-save cycles on one session across
+threads and worker processes.
+
+Each worker keeps at most ``cache_size`` sessions in memory, least recently
+used first out (sessions whose lock is held stay). ``sweep(max_age_s)``
+deletes sessions that have not been saved for ``max_age_s`` seconds.
+"""
+from __future__ import annotations
+
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+
+from lazy_imports import pd
+
+try:
+    import fcntl
+except ImportError:  # Windows: in-process locking only
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+FRAME_KEYS = ("raw", "steps")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id TEXT PRIMARY KEY,
+    version INTEGER NOT NULL,
+    meta TEXT NOT NULL,
+    manifest TEXT NOT NULL,
+    frame_bytes INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL NOT NULL
+)
+"""
+
+# Frame files not referenced by any manifest are only removed once they are
+# this old, so a file another worker is about to commit is never deleted.
+ORPHAN_GRACE_S = 3600
+
+
+def _write_frame(df: pd.DataFrame, path: Path) -> Path:
+    """Write df next to path (.arrow, or .pkl when Arrow cannot type a column)."""
+    if not isinstance(df.index, pd.RangeIndex) or df.index.start != 0 or df.index.step != 1:
+        df = df.reset_index(drop=True)
+    try:
+        import pyarrow as pa
+        import pyarrow.feather as feather
+        out = path.with_suffix(".arrow")
+        tmp = out.with_suffix(".arrow.tmp")
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        feather.write_feather(table, str(tmp), compression="uncompressed")
+    except Exception as e:
+        logger.warning(f"⚠️ Arrow could not store {path.name} ({e}); falling back to pickle")
+        out = path.with_suffix(".pkl")
+        tmp = out.with_suffix(".pkl.tmp")
+        df.to_pickle(str(tmp))
+    os.replace(tmp, out)
+    return out
+
+
+def _read_frame(path: Path) -> pd.DataFrame:
+    pd.load()  # configure pandas before pyarrow imports it
+    if path.suffix == ".arrow":
+        import pyarrow as pa
+        with pa.memory_map(str(path), "r") as source:
+            table = pa.ipc.open_file(source).read_all()
+        return table.to_pandas(split_blocks=True)
+    return pd.read_pickle(str(path))
+
+
+class SessionStore:
+    def __init__(self, db_path: Path, frames_dir: Path, cache_size: int = 16):
+        self.db_path = Path(db_path)
+        self.frames_dir = Path(frames_dir)
+        self.cache_size = max(1, cache_size)
+        self._local = threading.local()
+        # sid -> {"version": int, "sess": dict, "files": {frame_key: (filename, df)}}, oldest use first
+        self._cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._session_locks: Dict[str, threading.Lock] = {}
+        self._ready = False
+
+    # -- plumbing ---------------------------------------------------------
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            if not self._ready:
+                self.db_path.parent.mkdir(parents=True, exist_ok=True)
+                self.frames_dir.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.db_path), timeout=30.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            if not self._ready:
+                conn.execute(_SCHEMA)
+                self._ready = True
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _frames(sess: Dict[str, Any]) -> Iterator[Tuple[str, pd.DataFrame]]:
+        raw = sess.get("raw")
+        if isinstance(raw, pd.DataFrame):
+            yield "raw", raw
+        for name, df in (sess.get("steps") or {}).items():
+            if isinstance(df, pd.DataFrame):
+                yield f"steps/{name}", df
+
+    @contextmanager
+    def lock(self, sid: str):
+        """Exclusive lock on one session: a thread lock, then an flock for other workers."""
+        with self._cache_lock:
+            tlock = self._session_locks.setdefault(sid, threading.Lock())
+        with tlock:
+            sdir = self.frames_dir / sid
+            sdir.mkdir(parents=True, exist_ok=True)
+            with open(sdir / ".lock", "a+") as fh:
+                if fcntl is not None:
+                    fcntl.flock(fh.fileno(), fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(fh.fileno(), fcntl.LOCK_UN)
+
+    def _remember(self, sid: str, entry: Dict[str, Any]) -> None:
+        """Cache entry as most recently used and evict the least recently used (caller holds _cache_lock)."""
+        self._cache[sid] = entry
+        self._cache.move_to_end(sid)
+        excess = len(self._cache) - self.cache_size
+        for old in list(self._cache):
+            if excess <= 0:
+                break
+            lock = self._session_locks.get(old)
+            # A session being read-modified-saved must keep its entry until the save
+            if old != sid and not (lock is not None and lock.locked()):
+                del self._cache[old]
+                excess -= 1
+
+    # -- dict-like API ----------------------------------------------------
+    def __contains__(self, sid: str) -> bool:
+        row = self._conn().execute("SELECT 1 FROM sessions WHERE id = ?", (sid,)).fetchone()
+        return row is not None
+
+    def __len__(self) -> int:
+        return int(self._conn().execute("SELECT COUNT(*) FROM sessions").fetchone()[0])
+
+    def __getitem__(self, sid: str) -> Dict[str, Any]:
+        sess = self.get(sid)
+        if sess is None:
+            raise KeyError(sid)
+        return sess
+
+    def __setitem__(self, sid: str, sess: Dict[str, Any]) -> None:
+        with self._cache_lock:
+            entry = self._cache.get(sid) or {"version": 0, "files": {}}
+            entry = dict(entry, sess=sess)
+            self._remember(sid, entry)
+        self._save(sid, entry)
+
+    def get(self, sid: str) -> Optional[Dict[str, Any]]:
+        conn = self._conn()
+        for attempt in range(3):
+            row = conn.execute("SELECT version, meta, manifest FROM sessions WHERE id = ?", (sid,)).fetchone()
+            if row is None:
+                return None
+            version, meta, manifest = row
+            with self._cache_lock:
+                cached = self._cache.get(sid)
+                if cached is not None:
+                    self._cache.move_to_end(sid)
+            if cached is not None and cached["version"] == version:
+                return cached["sess"]
+            try:
+                return self._load(sid, version, json.loads(meta), json.loads(manifest), cached)
+            except FileNotFoundError:
+                # A concurrent save replaced the files between our read and open; retry
+                time.sleep(0.01 * (attempt + 1))
+        raise RuntimeError(f"Session {sid} changed repeatedly while loading")
+
+    def _load(self, sid: str, version: int, meta: Dict[str, Any], manifest: Dict[str, str],
+              cached: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        old_files = cached["files"] if cached else {}
+        by_file: Dict[str, pd.DataFrame] = {}
+        files: Dict[str, Tuple[str, pd.DataFrame]] = {}
+        sess: Dict[str, Any] = dict(meta)
+        sess["steps"] = {}
+
+        for key, fname in manifest.items():
+            df = by_file.get(fname)
+            prev = old_files.get(key)
+            if df is None and prev is not None and prev[0] == fname:
+                # Unchanged since this worker last saw it: reuse the in-memory frame
+                df = prev[1]
+            if df is None:
+                df = _read_frame(self.frames_dir / sid / fname)
+            by_file[fname] = df
+            files[key] = (fname, df)
+            if key == "raw":
+                sess["raw"] = df
+            else:
+                sess["steps"][key.split("/", 1)[1]] = df
+
+        with self._cache_lock:
+            self._remember(sid, {"version": version, "sess": sess, "files": files})
+        return sess
+
+    def save(self, sid: str) -> None:
+        """Persist this worker's copy of the session; only changed frames are written."""
+        cached = self._cache.get(sid)
+        if cached is None:
+            raise KeyError(sid)
+        self._save(sid, cached)
+
+    def _save(self, sid: str, cached: Dict[str, Any]) -> None:
+        sess = cached["sess"]
+        sdir = self.frames_dir / sid
+        sdir.mkdir(parents=True, exist_ok=True)
+
+        written: Dict[int, str] = {}
+        files: Dict[str, Tuple[str, pd.DataFrame]] = {}
+        for key, df in self._frames(sess):
+            prev = cached["files"].get(key)
+            if prev is not None and prev[1] is df and (sdir / prev[0]).exists():
+                fname = prev[0]
+            elif id(df) in written:
+                # Same object under two keys (e.g. launch is the offers frame)
+                fname = written[id(df)]
+            else:
+                stem = f"{key.replace('/', '-')}-{uuid.uuid4().hex[:8]}"
+                fname = _write_frame(df, sdir / stem).name
+            written[id(df)] = fname
+            files[key] = (fname, df)
+
+        manifest = {k: v[0] for k, v in files.items()}
+        meta = {k: v for k, v in sess.items() if k not in FRAME_KEYS}
+        frame_bytes = sum((sdir / f).stat().st_size for f in set(manifest.values()))
+
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT manifest FROM sessions WHERE id = ?", (sid,)).fetchone()
+            conn.execute(
+                "INSERT INTO sessions (id, version, meta, manifest, frame_bytes, updated_at) "
+                "VALUES (?, 1, ?, ?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET version = version + 1, meta = excluded.meta, "
+                "manifest = excluded.manifest, frame_bytes = excluded.frame_bytes, updated_at = excluded.updated_at",
+                (sid, json.dumps(meta, default=str), json.dumps(manifest), frame_bytes, time.time()))
+            version = conn.execute("SELECT version FROM sessions WHERE id = ?", (sid,)).fetchone()[0]
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        with self._cache_lock:
+            self._remember(sid, {"version": version, "sess": sess, "files": files})
+
+        # Files the previous manifest used and this one no longer does
+        stale = set(json.loads(row[0]).values()) - set(manifest.values()) if row else set()
+        for fname in stale:
+            try:
+                (sdir / fname).unlink()
+            except FileNotFoundError:
+                pass
+
+    def version(self, sid: str) -> Optional[int]:
+        """Current saved version of a session (bumped by every save), or None if absent."""
+        row = self._conn().execute("SELECT version FROM sessions WHERE id = ?", (sid,)).fetchone()
+        return int(row[0]) if row else None
+
+    def invalidate(self, sid: str) -> None:
+        """Drop this worker's copy so the next read reloads the last saved state."""
+        with self._cache_lock:
+            self._cache.pop(sid, None)
+
+    # -- housekeeping -----------------------------------------------------
+    def delete(self, sid: str) -> None:
+        self._conn().execute("DELETE FROM sessions WHERE id = ?", (sid,))
+        with self._cache_lock:
+            self._cache.pop(sid, None)
+        shutil.rmtree(self.frames_dir / sid, ignore_errors=True)
+
+    def sweep(self, max_age_s: float) -> List[Dict[str, Any]]:
+        """Delete sessions not saved for max_age_s seconds; returns the metadata of each one deleted."""
+        cutoff = time.time() - max_age_s
+        conn = self._conn()
+        stale = [sid for (sid,) in conn.execute("SELECT id FROM sessions WHERE updated_at < ?", (cutoff,))]
+        deleted = []
+        for sid in stale:
+            with self.lock(sid):
+                # Re-check under the lock: it may have been saved (or deleted) meanwhile
+                row = conn.execute("SELECT meta FROM sessions WHERE id = ? AND updated_at < ?",
+                                   (sid, cutoff)).fetchone()
+                if row is None:
+                    continue
+                self.delete(sid)
+                deleted.append(dict(json.loads(row[0]), id=sid))
+            with self._cache_lock:
+                lock = self._session_locks.get(sid)
+                if lock is not None and not lock.locked():
+                    del self._session_locks[sid]
+        if deleted:
+            logger.info(f"🧹 Deleted {len(deleted)} sessions not saved for {max_age_s / 3600:g}h")
+        return deleted
+
+    def total_frame_bytes(self) -> int:
+        return int(self._conn().execute("SELECT COALESCE(SUM(frame_bytes), 0) FROM sessions").fetchone()[0])
+
+    def recover(self) -> int:
+        """Open the index, drop frame files no session references; returns the session count."""
+        conn = self._conn()
+        referenced: Dict[str, set] = {}
+        for sid, manifest in conn.execute("SELECT id, manifest FROM sessions"):
+            referenced[sid] = set(json.loads(manifest).values())
+
+        cutoff = time.time() - ORPHAN_GRACE_S
+        removed = 0
+        for sdir in self.frames_dir.iterdir() if self.frames_dir.exists() else []:
+            if not sdir.is_dir():
+                continue
+            keep = referenced.get(sdir.name, set())
+            for f in sdir.iterdir():
+                # Dotfiles are lock files, which must outlive any holder
+                if f.name.startswith(".") and sdir.name in referenced:
+                    continue
+                if f.name not in keep and f.stat().st_mtime < cutoff:
+                    f.unlink(missing_ok=True)
+                    removed += 1
+            if sdir.name not in referenced and not any(sdir.iterdir()):
+                sdir.rmdir()
+        if removed:
+            logger.info(f"🧹 Removed {removed} orphaned session frame files")
+        return len(referenced)
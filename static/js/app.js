@@ -519,6 +519,8 @@ $("btnUpload")?.addEventListener("click", async()=>{
     showOverlay("Validation and Ingestion Agent","Validating & ingesting audience","📤");
     const data = await apiUpload(file);
     sessionId = data.session_id;
+    // Lets the Marketing Expert chat orchestrate this session's pipeline
+    try{ localStorage.setItem("niyaxSessionId", sessionId); }catch(_){}
 
     setText("sessionBox", JSON.stringify(data, null, 2));
     setText("pillSession", `Session: ${sessionId.substring(0,8)}...`);
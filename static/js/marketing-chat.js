@@ -179,7 +179,186 @@ function selectPriority(priority) {
 }
 
 // ============ FULL ORCHESTRATION WITH COLLAPSIBLE REASONING ============
+// Live pipeline stage -> agent shown in the left panel
+const STAGE_AGENTS = {
+    lifecycle: 'segment',
+    opportunity: 'elasticity',
+    offers: 'offer',
+    forecast: 'prediction'
+};
+
 async function runFullOrchestration() {
+    const sessionId = getPipelineSession();
+    if (sessionId && window.EventSource) {
+        try {
+            await runLiveOrchestration(sessionId);
+            return;
+        } catch (e) {
+            // Nothing was streamed (session expired, server unreachable): fall back to the walkthrough
+            console.warn('Live orchestration unavailable:', e);
+        }
+    }
+    await runGuidedOrchestration();
+}
+
+// Session uploaded in the Marketing Expert workspace (or passed as ?session=)
+function getPipelineSession() {
+    const params = new URLSearchParams(window.location.search);
+    try {
+        return params.get('session') || localStorage.getItem('niyaxSessionId');
+    } catch (e) {
+        return params.get('session');
+    }
+}
+
+// ============ LIVE ORCHESTRATION (SERVER-SENT EVENTS) ============
+function runLiveOrchestration(sessionId) {
+    return new Promise((resolve, reject) => {
+        const source = new EventSource(`/api/orchestrate/${encodeURIComponent(sessionId)}`);
+        const agents = {};
+        const progressLines = {};
+        let forecast = null;
+        let started = false;
+        let finished = false;
+
+        source.addEventListener('plan', (e) => {
+            const plan = JSON.parse(e.data);
+            started = true;
+            activateMasterAgent();
+            removeTyping();
+
+            const planner = startAgent('planner');
+            addReasoningLine(planner, `Session base loaded for LOBs: ${plan.lobs.join(', ')}`);
+            for (const [stage, after] of Object.entries(plan.stages)) {
+                addReasoningLine(planner, after.length ? `• ${stage} after ${after.join(' + ')}` : `• ${stage} first`);
+            }
+            addReasoningLine(planner, '→ Independent stages run in parallel');
+            completeAgent(planner);
+        });
+
+        source.addEventListener('stage', (e) => {
+            const data = JSON.parse(e.data);
+            if (data.stage === 'launch' && data.status === 'completed') {
+                addAssistantMessage(`<p>📦 Launch file refreshed with the new offers (${data.summary.subscribers.toLocaleString()} subscribers).</p>`);
+                return;
+            }
+            const agentId = STAGE_AGENTS[data.stage];
+            if (!agentId) return;
+
+            if (data.status === 'running') {
+                agents[data.stage] = startAgent(agentId);
+                addReasoningLine(agents[data.stage], `Running ${data.stage} on the subscriber base`);
+                progressLines[data.stage] = addReasoningLine(agents[data.stage], '→ started');
+                showTyping();
+            } else if (data.status === 'completed') {
+                const item = agents[data.stage];
+                progressLines[data.stage].textContent = `→ finished in ${data.wall_s.toFixed(2)}s`;
+                completeAgent(item);
+                if (data.stage === 'forecast') forecast = data;
+                addAssistantMessage(renderStageResult(data));
+            } else if (data.status === 'failed') {
+                const item = agents[data.stage];
+                if (item) {
+                    addReasoningLine(item, `→ failed: ${data.error}`);
+                    completeAgent(item, true);
+                }
+                addAssistantMessage(`<p>⚠️ The <strong>${escapeHtml(data.stage)}</strong> stage failed: ${escapeHtml(String(data.error))}</p>`);
+            }
+        });
+
+        source.addEventListener('progress', (e) => {
+            const data = JSON.parse(e.data);
+            const line = progressLines[data.stage];
+            if (line) line.textContent = `→ working… ${data.elapsed_s.toFixed(1)}s`;
+        });
+
+        source.addEventListener('done', (e) => {
+            const data = JSON.parse(e.data);
+            finished = true;
+            source.close();
+            removeTyping();
+            addAssistantMessage(renderOrchestrationSummary(data, forecast));
+            state.phase = 'complete';
+            completeMasterAgent();
+            resolve();
+        });
+
+        source.onerror = () => {
+            if (finished) return;
+            source.close();
+            if (!started) {
+                reject(new Error('orchestration stream could not be opened'));
+                return;
+            }
+            removeTyping();
+            addAssistantMessage('<p>⚠️ The connection to the orchestration service was lost. Please try again.</p>');
+            completeMasterAgent();
+            resolve();
+        };
+    });
+}
+
+function renderStageResult(data) {
+    const s = data.summary || {};
+    if (data.stage === 'lifecycle') {
+        const rows = Object.entries(s.stages || {}).map(([stage, n]) =>
+            `<tr><td><strong>${escapeHtml(stage)}</strong></td><td>${n.toLocaleString()}</td><td>${(100 * n / (s.subscribers || 1)).toFixed(1)}%</td></tr>`).join('');
+        return `
+            <p><strong>${(s.subscribers || 0).toLocaleString()} subscribers segmented by lifecycle stage:</strong></p>
+            <table class="data-table">
+                <tr><th>Lifecycle Stage</th><th>Subscribers</th><th>Share</th></tr>
+                ${rows}
+            </table>`;
+    }
+    if (data.stage === 'opportunity') {
+        const rows = (s.opportunities || []).map(o =>
+            `<tr><td><strong>${escapeHtml(o.lob)}</strong></td><td>${escapeHtml(o.opportunity)}</td><td>${o.subscribers.toLocaleString()}</td></tr>`).join('');
+        return `
+            <p><strong>Top opportunities by line of business:</strong></p>
+            <table class="data-table">
+                <tr><th>LOB</th><th>Opportunity</th><th>Subscribers</th></tr>
+                ${rows}
+            </table>`;
+    }
+    if (data.stage === 'offers') {
+        const rows = (s.top_offers || []).map(o =>
+            `<tr><td><strong>${escapeHtml(o.offer)}</strong></td><td>${o.subscribers.toLocaleString()}</td></tr>`).join('');
+        return `
+            <p><strong>Offers assigned to ${(s.subscribers || 0).toLocaleString()} subscribers. Most recommended:</strong></p>
+            <table class="data-table">
+                <tr><th>Offer</th><th>Subscribers</th></tr>
+                ${rows}
+            </table>`;
+    }
+    const k = data.kpis || {};
+    return `
+        <p><strong>Projected impact</strong> <small>(based on ${escapeHtml(data.basis || 'base')})</small>:</p>
+        <table class="data-table impact-table">
+            <tr><th>Metric</th><th>Expected Change</th></tr>
+            <tr><td>Revenue</td><td><span class="tag green">+${k.rev_uplift_pct}%</span></td></tr>
+            <tr><td>Margin</td><td><span class="tag green">+${k.margin_uplift_pct}%</span></td></tr>
+            <tr><td>Churn</td><td><span class="tag green">-${k.churn_reduction_pct}%</span></td></tr>
+        </table>`;
+}
+
+function renderOrchestrationSummary(done, forecast) {
+    if (!done.ok) {
+        return `<p>The run finished with failed stages: <strong>${done.failed.map(escapeHtml).join(', ')}</strong>. Check the session data and try again.</p>`;
+    }
+    const k = (forecast && forecast.kpis) || {};
+    return `
+        <p>All stages completed in <strong>${done.wall_s.toFixed(1)}s</strong>.</p>
+        <p>The recommended offers are projected to lift revenue by <strong>${k.rev_uplift_pct}%</strong> and cut churn by <strong>${k.churn_reduction_pct}%</strong>.</p>
+        <p>Would you like me to <strong>design</strong>, <strong>review creatives</strong>, or <strong>refine targeting</strong>?</p>
+        <div class="msg-actions">
+            <button class="action-btn primary" onclick="handleAction('design')">🎨 Design</button>
+            <button class="action-btn secondary" onclick="handleAction('review')">📋 Show Campaign Details</button>
+            <button class="action-btn secondary" onclick="handleAction('refine')">🎯 Refine Targeting</button>
+        </div>`;
+}
+
+// ============ GUIDED WALKTHROUGH (NO UPLOADED SESSION) ============
+async function runGuidedOrchestration() {
     activateMasterAgent();
     
     // ===== STEP 1: Outcome Planner Agent =====
@@ -390,41 +569,63 @@ async function runFullOrchestration() {
     completeMasterAgent();
 }
 
-// ============ RUN SINGLE AGENT WITH REASONING ============
-async function runAgentWithReasoning(agentId, reasoningSteps, rightPanelOutput) {
+// ============ AGENT PANEL ============
+function startAgent(agentId) {
     const agentItem = document.querySelector(`.agent-item[data-agent="${agentId}"]`);
-    if (!agentItem) return;
+    if (!agentItem) return null;
     
     const statusIndicator = agentItem.querySelector('.agent-status-indicator');
-    const toggle = agentItem.querySelector('.agent-toggle');
     const reasoningDiv = agentItem.querySelector('.agent-reasoning');
     
-    // Show the agent (remove hidden class)
-    agentItem.classList.remove('hidden');
-    
-    // Activate agent
+    // Show and activate the agent
+    agentItem.classList.remove('hidden', 'completed');
     agentItem.classList.add('active');
     statusIndicator.textContent = '⟳';
     statusIndicator.classList.add('spinning');
     
     // Expand reasoning
-    toggle.textContent = '▼';
+    agentItem.querySelector('.agent-toggle').textContent = '▼';
     reasoningDiv.classList.add('expanded');
     reasoningDiv.innerHTML = '';
+    return agentItem;
+}
+
+function addReasoningLine(agentItem, text) {
+    if (!agentItem) return document.createElement('span');
+    const stepDiv = document.createElement('div');
+    stepDiv.className = (text.startsWith('•') || text.startsWith('→')) ? 'reasoning-step sub' : 'reasoning-step';
+    stepDiv.innerHTML = `<span class="reasoning-text"></span>`;
+    agentItem.querySelector('.agent-reasoning').appendChild(stepDiv);
+    
+    const textEl = stepDiv.querySelector('.reasoning-text');
+    textEl.textContent = text;
+    return textEl;
+}
+
+function completeAgent(agentItem, failed = false) {
+    if (!agentItem) return;
+    const statusIndicator = agentItem.querySelector('.agent-status-indicator');
+    agentItem.classList.remove('active');
+    agentItem.classList.add('completed');
+    statusIndicator.textContent = failed ? '✕' : '✓';
+    statusIndicator.classList.remove('spinning');
+    
+    // Collapse reasoning (user can expand later by clicking)
+    agentItem.querySelector('.agent-toggle').textContent = '▶';
+    agentItem.querySelector('.agent-reasoning').classList.remove('expanded');
+}
+
+// ============ RUN SINGLE AGENT WITH REASONING (GUIDED WALKTHROUGH) ============
+async function runAgentWithReasoning(agentId, reasoningSteps, rightPanelOutput) {
+    const agentItem = startAgent(agentId);
+    if (!agentItem) return;
     
     // Type out reasoning steps one by one
     for (const step of reasoningSteps) {
-        const stepDiv = document.createElement('div');
-        stepDiv.className = 'reasoning-step';
-        
+        const textEl = addReasoningLine(agentItem, '');
         if (step.startsWith('•') || step.startsWith('→')) {
-            stepDiv.className = 'reasoning-step sub';
+            textEl.parentElement.className = 'reasoning-step sub';
         }
-        
-        stepDiv.innerHTML = `<span class="reasoning-text"></span>`;
-        reasoningDiv.appendChild(stepDiv);
-        
-        const textEl = stepDiv.querySelector('.reasoning-text');
         for (let i = 0; i < step.length; i++) {
             textEl.textContent += step[i];
             await delay(15);
@@ -432,16 +633,8 @@ async function runAgentWithReasoning(agentId, reasoningSteps, rightPanelOutput)
         await delay(200);
     }
     
-    // Mark agent as complete
     await delay(500);
-    agentItem.classList.remove('active');
-    agentItem.classList.add('completed');
-    statusIndicator.textContent = '✓';
-    statusIndicator.classList.remove('spinning');
-    
-    // Collapse reasoning (user can expand later by clicking)
-    toggle.textContent = '▶';
-    reasoningDiv.classList.remove('expanded');
+    completeAgent(agentItem);
     
     // Show right panel output if provided
     if (rightPanelOutput) {